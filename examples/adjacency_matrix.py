@@ -1,7 +1,7 @@
-import random
 import time
 
 import kinbaku as kn
+import numpy as np
 from tqdm import tqdm
 
 # number of nodes and edges
@@ -9,21 +9,19 @@ N = 2000
 M = 100 * N
 
 # create graph
+rng = np.random.default_rng()
+edges = rng.integers(0, N, size=(M, 2)).astype(str).tolist()
 G = kn.Graph("test.db", flag="n")
-for _ in tqdm(range(M), desc="inserting edges"):
-    u = str(random.randint(0, N-1))
-    v = str(random.randint(0, N-1))
-    G.add_edge(u, v)
-del G
+G.add_edges(tqdm(
+    edges, desc="inserting edges", miniters=M // 1000, mininterval=.5))
+G.flush()
 
 # adjacency matrix of the whole graph
 start = time.time()
-G = kn.Graph("test.db", flag="r")
 A, index_to_node = G.adjacency_matrix()
 print(time.time() - start)
 
 # adjacency matrix of a subgraph
 start = time.time()
-G = kn.Graph("test.db", flag="r")
 A, index_to_node = G.subgraph([str(i) for i in range(100)])
 print(time.time() - start)
@@ -1,30 +1,28 @@
 import kinbaku as kn
 import networkx as nx
+import numpy as np
 
 G = kn.Graph("test.db", flag="n")
-G_nx = nx.cycle_graph(5000)
 
-for u, v in G_nx.edges:
-    u = str(u)
-    v = str(v)
-    G.add_edge(u, v)
+# edges (i, i + 1 mod N) of a cycle graph
+N = 5000
+sources = np.arange(N, dtype=np.int64)
+targets = (sources + 1) % N
+pairs = np.column_stack((sources, targets))
+G.add_edges(pairs.astype(str).tolist())
 
-batch_size = 100
-edges, cursor = G.batch_get_edges(batch_size=batch_size, cursor=0)
-while cursor != -1:
-    batch_edges, cursor = G.batch_get_edges(
-        batch_size=batch_size, cursor=cursor)
-    edges.extend(batch_edges)
+# networkx is only used as a reference
+G_nx = nx.from_edgelist(pairs.tolist(), create_using=nx.DiGraph)
 
+edges = G.readall_edges()
 edges = {(int(u), int(v)) for u, v in edges}
 true_edges = set(G_nx.edges)
 print(true_edges == edges)
 
 
-nodes, cursor = G.batch_get_nodes(batch_size=batch_size, cursor=0)
-while cursor != -1:
-    batch_nodes, cursor = G.batch_get_nodes(
-        batch_size=batch_size, cursor=cursor)
+batch_size = 100
+nodes = []
+for batch_nodes in G.iter_nodes_batches(batch_size=batch_size):
     nodes.extend(batch_nodes)
 
 nodes = {int(node.key) for node in nodes}
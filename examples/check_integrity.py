@@ -2,51 +2,84 @@ import random
 
 import kinbaku as kn
 import networkx as nx
+import numpy as np
 from tqdm import tqdm
 
+
+def insert(items, index, item):
+    if item not in index:
+        index[item] = len(items)
+        items.append(item)
+
+
+def pop_random(items, index):
+    # swap the drawn item with the last one, then pop
+    i = random.randrange(len(items))
+    item = items[i]
+    last = items.pop()
+    if i < len(items):
+        items[i] = last
+        index[last] = i
+    del index[item]
+    return item
+
+
 # create graphs
 G_kn = kn.Graph("test.db", flag="n")
 G_nx = nx.DiGraph()
 
 N = 10000
 iterations = 100000
-nodes = set()
-edges = set()
+# lists + position dicts, for O(1) random sampling and removal
+nodes, node_index = [], {}
+edges, edge_index = [], {}
 
 # =============================================================================
 # ADD AND REMOVE EDGES RANDOMLY
 # probability of a deletion happening
 p_edge_del = .2
 p_node_del = .25
-for _ in tqdm(range(iterations), desc="edge insertion & deletion"):
-    assert len(G_nx.edges) == G_kn.n_edges
-    assert len(G_nx.nodes) == G_kn.n_nodes
+rng = np.random.default_rng()
+draws = rng.random(iterations).tolist()
+random_edges = rng.integers(0, N, size=(iterations, 2)).astype(str).tolist()
+n_nodes = n_edges = 0  # expected counts, maintained incrementally
+for draw, (u, v) in tqdm(
+    zip(draws, random_edges),
+    total=iterations, desc="edge insertion & deletion",
+    miniters=iterations // 1000, mininterval=.5
+):
+    assert n_edges == G_kn.n_edges
+    assert n_nodes == G_kn.n_nodes
 
-    draw = random.random()
-    if draw < p_edge_del and len(G_nx.edges) > 1:
-        u, v = random.choice(list(edges))
-        edges.remove((u, v))
+    if draw < p_edge_del and n_edges > 1:
+        u, v = pop_random(edges, edge_index)
 
         try:
             G_nx.remove_edge(u, v)
             G_kn.remove_edge(u, v)
+            n_edges -= 1
         except nx.exception.NetworkXError:
             pass
-    elif draw < p_node_del + p_edge_del and len(G_nx.nodes) > 1:
-        u = random.choice(list(nodes))
+    elif draw < p_node_del + p_edge_del and n_nodes > 1:
+        u = pop_random(nodes, node_index)
+        n_edges -= (
+            G_nx.out_degree(u) + G_nx.in_degree(u) - G_nx.has_edge(u, u))
+        n_nodes -= 1
         G_nx.remove_node(u)
         G_kn.remove_node(u)
-        nodes.remove(u)
     else:
         # create a random edge
-        u = str(random.randint(0, N-1))
-        v = str(random.randint(0, N-1))
-
-        nodes.update({u, v})
-        edges.add((u, v))
+        n_nodes += len({u, v}.difference(node_index))
+        n_edges += not G_nx.has_edge(u, v)
+        insert(nodes, node_index, u)
+        insert(nodes, node_index, v)
+        insert(edges, edge_index, (u, v))
         G_nx.add_edge(u, v)
         G_kn.add_edge(u, v)
 
+assert n_edges == G_nx.number_of_edges()
+assert n_nodes == G_nx.number_of_nodes()
+
 # =============================================================================
 # CHECK THAT TOMBSTONES CAN BE FOUND
 del G_kn
@@ -62,19 +95,21 @@ assert set(G_kn.edges) == set(G_nx.edges)
 
 # =============================================================================
 # CHECK THAT GRAPHS RETURN SAME NEIGHBORS AND PREDECESSORS
-for node in tqdm(G_kn.nodes, total=G_kn.n_nodes, desc="check neighbors"):
-    G_neighbors = set(G_kn.neighbors(node))
-    graph_neighbors = set(G_nx.neighbors(node))
-    try:
-        assert G_neighbors == graph_neighbors
-    except AssertionError:
-        print(G_neighbors)
-        print(graph_neighbors)
-        raise AssertionError
+keys = list(G_kn.nodes)
+nx_neighbors = {key: set(G_nx.neighbors(key)) for key in keys}
+nx_predecessors = {key: set(G_nx.predecessors(key)) for key in keys}
+for key, neighbors in tqdm(
+    zip(keys, G_kn.neighbors_from(keys)),
+    total=len(keys), desc="check neighbors"
+):
+    neighbors = set(neighbors)
+    assert neighbors == nx_neighbors[key], (neighbors, nx_neighbors[key])
 
-    G_predecessors = set(G_kn.predecessors(node))
-    graph_predecessors = set(G_nx.predecessors(node))
-    assert G_predecessors == graph_predecessors
+for key, predecessors in tqdm(
+    zip(keys, G_kn.predecessors_from(keys)),
+    total=len(keys), desc="check predecessors"
+):
+    assert set(predecessors) == nx_predecessors[key]
 
 # =============================================================================
 # CHECK THAT PARENTING IN NODES AND EDGES WORK
@@ -1,6 +1,7 @@
 import random
 
 import kinbaku as kn
+import numpy as np
 from tqdm import tqdm
 
 # create graph
@@ -9,15 +10,18 @@ G = kn.Graph("test.db", flag="n")
 # create random connections
 N = 10000
 M = 500 * N
-for _ in tqdm(range(M), desc="inserting edges"):
-    u = str(random.randint(0, N-1))
-    v = str(random.randint(0, N-1))
-    G.add_edge(u, v)
+rng = np.random.default_rng()
+edges = rng.integers(0, N, size=(M, 2)).astype(str).tolist()
+G.add_edges(tqdm(
+    edges, desc="inserting edges", miniters=M // 1000, mininterval=.5))
 
 # remove edges in a random order
 edges = list(G.edges)
 random.shuffle(edges)
-for u, v in tqdm(edges, total=G.n_edges, desc="removing edges"):
+for u, v in tqdm(
+    edges, total=G.n_edges, desc="removing edges",
+    miniters=G.n_edges // 1000, mininterval=.5
+):
     G.remove_edge(u, v)
 
 # check that everything works as expected
@@ -1,6 +1,7 @@
 import random
 
 import kinbaku as kn
+import numpy as np
 from tqdm import tqdm
 
 # create graph
@@ -9,11 +10,10 @@ G = kn.Graph("test.db", flag="n")
 # create random connections
 N = 2000
 M = 1000 * N
-
-for _ in tqdm(range(M), desc="inserting edges"):
-    u = str(random.randint(0, N-1))
-    v = str(random.randint(0, N-1))
-    G.add_edge(u, v)
+rng = np.random.default_rng()
+edges = rng.integers(0, N, size=(M, 2)).astype(str).tolist()
+G.add_edges(tqdm(
+    edges, desc="inserting edges", miniters=M // 1000, mininterval=.5))
 
 # remove edges in a random order
 nodes = list(G.nodes)
@@ -5,10 +5,10 @@ G = kn.Graph("test.db", flag="n")
 
 # create random edges
 N = 200000  # number of nodes
-for i in tqdm(range(N)):
+for i in tqdm(range(N), miniters=N // 1000, mininterval=.5):
     G.add_node(str(i))
 
-for i in tqdm(range(N)):
+for i in tqdm(range(N), miniters=N // 1000, mininterval=.5):
     G.add_edge("0", str(i))
 
 for i in tqdm(range(1)):
@@ -1,14 +1,12 @@
-import random
-
 import kinbaku as kn
+import numpy as np
 from tqdm import tqdm
 
 N = 5000  # number of nodes
 d = 50  # average degree
 
 # create random edges
+rng = np.random.default_rng()
+edges = rng.integers(0, N, size=(N * d, 2)).astype(str).tolist()
 G = kn.Graph("test.db", flag="n")
-for _ in tqdm(range(N * d)):
-    u = str(random.randint(0, N - 1))
-    v = str(random.randint(0, N - 1))
-    G.add_edge(u, v)
+G.add_edges(tqdm(edges, miniters=N * d // 1000, mininterval=.5))
@@ -5,14 +5,14 @@ Self-loops are allowed but multiple edges of a same edge type are not.
 import math
 import mmap
 import os
-from struct import error, pack, unpack
-
-from cachetools import LRUCache
+from itertools import islice
+from struct import Struct, calcsize, error
 
 from .exception import (EdgeNotFound, KeyTooLong, KinbakuError,
                         KinbakuException, NodeNotFound)
 from .structure import Edge, Header, Node, text
-from .utils import compare_edges, compare_nodes, to_string
+from .utils import (Cache, compare_edge_ties, compare_edges, compare_nodes,
+                    get_encoding)
 
 
 class Graph:
@@ -24,6 +24,7 @@ class Graph:
         max_key_len=15,
         int_format="l",
         char_format="h",
+        char_encoding=None,
         bool_format="?",
         hash_format="I",
         cache_len=1000000,
@@ -39,16 +40,29 @@ class Graph:
         Args:
             filename (str): path to database. File created if it does not exist
             hash_func (function, optional): hashing function. None means that
-                                            Google's CityHash will be used.
+                                            Google's CityHash will be used,
+                                            or MurmurHash3 if cityhash is
+                                            not installed. Its values must
+                                            fit in `hash_format`.
                                             Defaults to None.
             max_str_len (int, optional): max length of a string field.
                                          Defaults to 15.
             max_key_len (int, optional): max length of node keys.
                                          Defaults to 15.
             int_format (str, optional): format for integers as described in
-                                        struct package. Defaults to "l".
-            char_format (str, optional): format for characters.
-                                         Defaults to "h".
+                                        struct package. 4-byte "i" is
+                                        enough below 2**31 records, and
+                                        makes every record smaller.
+                                        Defaults to "l".
+            char_format (str, optional): format for characters, 1, 2 or 4
+                                         bytes wide (latin-1, UTF-16 or
+                                         UTF-32). Defaults to "h".
+            char_encoding (str, optional): "utf-8" stores keys and strings
+                                           as UTF-8 with 1-byte formats:
+                                           their max lengths then count
+                                           bytes. None means the encoding
+                                           of char_format.
+                                           Defaults to None.
             bool_format (str, optional): format for booleans.
                                          Defaults to "?".
             hash_format (str, optional): format for containing hashes.
@@ -73,10 +87,17 @@ class Graph:
         --------
         >>> G = kn.Graph("test.db")
         >>> G = kn.Graph("test.db", flag="r")
-        >>> G = kn.Graph("test.db", hash_func=lambda x: math.abs(hash(x)))
+        >>> G = kn.Graph("test.db", hash_func=xxhash.xxh3_64_intdigest,
+        ...              hash_format="Q")
         """
         self.filename = filename
         self.table_increment = table_increment
+        # number of edges read at once from the input of add_edges
+        self.ADD_EDGES_CHUNK = 10000
+        # number of table slots viewed at once when iterating over edges
+        self.SCAN_WINDOW = 65536
+        # smallest read-ahead of the batch cursors, in bytes
+        self.READ_AHEAD = 1 << 17
         self.flag = flag
 
         if hash_func is None:
@@ -85,7 +106,8 @@ class Graph:
                 self.hash_func = CityHash32
             except ImportError:
                 import mmh3
-                self.hash_func = lambda x: mmh3.hash(x, signed=False)
+                # unsigned, seed 0; positional arguments are cheaper to parse
+                self.hash_func = lambda x: mmh3.hash(x, 0, False)
         else:
             self.hash_func = hash_func
 
@@ -94,16 +116,22 @@ class Graph:
         self.max_key_len = max_key_len
         self.int_format = int_format
         self.char_format = char_format
+        self.char_size = calcsize(char_format)
+        self.char_encoding = get_encoding(char_format, char_encoding)
         self.bool_format = bool_format
         self.hash_format = hash_format
+        self._encode_key = self._text_encoder(max_key_len, KeyTooLong)
+        self._encode_str = self._text_encoder(
+            max_str_len, KinbakuError,
+            f"string longer than {max_str_len * self.char_size} bytes "
+            f"once encoded as {self.char_encoding}")
 
         # initialize cache
         self.preload = preload
         self.cache_len = cache_len
-        self.cache_id_to_key = LRUCache(cache_len)
-        self.cache_key_to_pos = LRUCache(cache_len)
-        self.cache_pos_to_node = LRUCache(cache_len)
-        self.cache_pos_to_node_tree = LRUCache(cache_len)
+        self.cache_key_to_pos = Cache(cache_len)
+        self.cache_pos_to_node = Cache(cache_len)
+        self.cache_pos_to_node_tree = Cache(cache_len)
 
         self.edge_tombstone = []
         self.node_tombstone = []
@@ -155,10 +183,33 @@ class Graph:
         Yields:
             iterator: an iterator over all nodes
         """
-        position = 0
-        leaf = self._get_node_at(position)
-        for node in self._node_dfs(leaf):
-            yield node.key
+        # same pre-order walk as _node_dfs, reading only the links and the
+        # key of the nodes that are not cached, instead of decoding them
+        get_cached = self.cache_pos_to_node.get
+        unpack_walk = self.NODE_WALK_STRUCT.unpack_from
+        EDGE_SIZE = self.EDGE_SIZE
+        HEADER_SIZE = self.HEADER_SIZE
+        ENCODING = self.char_encoding
+
+        stack = [0]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            position = pop()
+            node = get_cached(position)
+            if node is not None:
+                left, right, key = node.left, node.right, node.key
+            else:
+                left, right, key = unpack_walk(
+                    self.mm, position * EDGE_SIZE + HEADER_SIZE)
+                key = key.decode(ENCODING).rstrip("\x00")
+            if position != 0:  # skip the root
+                yield key
+
+            if right != 0:
+                push(right)
+            if left != 0:
+                push(left)
 
     @property
     def edges(self):
@@ -167,8 +218,31 @@ class Graph:
         Yields:
             iterator: an iterator over all edges
         """
-        for edge in self._iter_edges():
-            yield self._get_keys_from_edge(edge)
+        try:
+            import numpy as np
+        except ImportError:
+            # NumPy is optional: fall back to decoding edges one by one
+            for edge in self._iter_edges():
+                yield self._get_keys_from_edge(edge)
+            return
+
+        # scan the table by windows of slots, so that memory use does not
+        # grow with the graph: the keys of each window are read once
+        _get_node_at = self._get_node_at
+        position = 0
+        while position < self._n_slots():
+            edges, position = self._scan_window(
+                ("source_position", "target_position"), position,
+                min(position + self.SCAN_WINDOW, self._n_slots()))
+            n_edges = len(edges)
+            positions, inverse = np.unique(
+                np.concatenate((edges["source_position"],
+                                edges["target_position"])),
+                return_inverse=True)
+            keys = [_get_node_at(p).key for p in positions.tolist()]
+            for u, v in zip(inverse[:n_edges].tolist(),
+                            inverse[n_edges:].tolist()):
+                yield keys[u], keys[v]
 
     # =========================================================================
     # Parsers
@@ -177,83 +251,169 @@ class Graph:
     def _parse_fields(self, data):
         DATA_FORMAT = ""
         DATA_VALUES = []
+        FIELDS = {}
         for field in data.__dataclass_fields__.values():
             if field.name == "hash":
-                DATA_FORMAT += self.hash_format
+                FIELD_FORMAT = self.hash_format
                 DATA_VALUES.append(0)
             elif field.type == text:
-                DATA_FORMAT += field.default.length * self.char_format
+                FIELD_FORMAT = field.default.length * self.char_format
                 DATA_VALUES += (0,) * field.default.length
             elif field.type == int:
-                DATA_FORMAT += self.int_format
+                FIELD_FORMAT = self.int_format
                 DATA_VALUES.append(0)
             elif field.name == "key":
-                DATA_FORMAT += self.max_key_len * self.char_format
-                DATA_VALUES += (0,) * self.max_key_len
+                FIELD_FORMAT = self._text_format(self.max_key_len)
+                DATA_VALUES.append(b"")
             elif field.type == str:
-                DATA_FORMAT += self.max_str_len * self.char_format
-                DATA_VALUES += (0,) * self.max_str_len
+                FIELD_FORMAT = self._text_format(self.max_str_len)
+                DATA_VALUES.append(b"")
             elif field.type == bool:
-                DATA_FORMAT += self.bool_format
+                FIELD_FORMAT = self.bool_format
                 DATA_VALUES.append(False)
             elif field.type == float:
-                DATA_FORMAT += "f"
+                FIELD_FORMAT = "f"
                 DATA_VALUES.append(0.0)
-        return DATA_FORMAT, DATA_VALUES
-
-    def _parse_values(self, data):
+            else:
+                continue
+            # byte offset of the field, accounting for native alignment
+            offset = (calcsize(DATA_FORMAT + FIELD_FORMAT) -
+                      calcsize(FIELD_FORMAT))
+            FIELDS[field.name] = (offset, FIELD_FORMAT)
+            DATA_FORMAT += FIELD_FORMAT
+        return DATA_FORMAT, DATA_VALUES, FIELDS
+
+    def _fields_struct(self, FIELDS, names):
+        # struct reading only the given fields of a record, skipping the
+        # bytes in between
+        FORMAT = ""
+        for name in sorted(names, key=lambda name: FIELDS[name][0]):
+            offset, FIELD_FORMAT = FIELDS[name]
+            FORMAT += f"{offset - calcsize(FORMAT)}x{FIELD_FORMAT}"
+        return Struct(FORMAT)
+
+    def _text_format(self, length):
+        # strings are stored as a single bytes field, encoded with one
+        # char_format unit per character; the leading zero-repeat code keeps
+        # the alignment of char_format
+        width = length * calcsize(self.char_format)
+        return f"0{self.char_format}{width}s"
+
+    def _compile_codecs(self, data, DATA_STRUCT):
+        # generate a packer and a decoder specialized to the fields of the
+        # dataclass, rather than dispatching on the fields at every access
         values = []
-        extend = values.extend
-        append = values.append
-        for field in data.__dataclass_fields__.keys():
-            value = getattr(data, field)
-            if isinstance(value, (int, bool)):
-                append(value)
-            elif isinstance(value, str):
-                if field != "key":
-                    extend(self._str_to_list(value))
-                else:
-                    extend(self._key_to_list(value))
-            elif isinstance(value, tuple):
-                extend(list(value))
+        args = []
+        i = 0
+        keywords = False
+        for field in data.__dataclass_fields__.values():
+            name = field.name
+            if name == "hash" or field.type in (int, bool, float):
+                value, arg, length = f"item.{name}", f"data[{i}]", 1
+            elif field.type == text:
+                length = field.default.length
+                value, arg = f"*item.{name}", f"data[{i}:{i + length}]"
+            elif name == "key":
+                length = 1
+                value = f"encode_key(item.{name})"
+                arg = f"data[{i}].decode(ENCODING).rstrip(NUL)"
+            elif field.type == str:
+                length = 1
+                value = f"encode_str(item.{name})"
+                arg = f"data[{i}].decode(ENCODING).rstrip(NUL)"
             else:
-                append(value)
-        return values
+                # not stored: following fields must be passed by name
+                keywords = True
+                continue
+            values.append(value)
+            args.append(f"{name}={arg}" if keywords else arg)
+            i += length
+
+        source = (
+            "def pack_item(buffer, offset, item):\n"
+            f"    pack_into(buffer, offset, {', '.join(values)})\n"
+            "def decode(data):\n"
+            f"    return data_class({', '.join(args)})\n")
+        namespace = {
+            "pack_into": DATA_STRUCT.pack_into,
+            "data_class": data,
+            "encode_key": self._encode_key,
+            "encode_str": self._encode_str,
+            "ENCODING": self.char_encoding,
+            "NUL": "\x00"}
+        exec(source, namespace)
+        return namespace["pack_item"], namespace["decode"]
 
     def _parse_attributes(self, leaf, attr):
         if attr is None:
             return
-        for attribute, value in attr.items():
+        # strings are checked on their encoded size (UTF-8 counts bytes),
+        # before the caller writes anything
+        encode_str = self._encode_str
+        for value in attr.values():
             if isinstance(value, str):
-                assert len(value) <= self.max_str_len
-            setattr(leaf, attribute, value)
+                encode_str(value)
+        try:
+            # plain dataclasses: set all the attributes at once
+            leaf.__dict__.update(attr)
+        except AttributeError:
+            # slotted classes (such as the default ones) have no __dict__
+            for name, value in attr.items():
+                setattr(leaf, name, value)
 
     # =========================================================================
     # Initializers
     # =========================================================================
 
     def _init_edge_size(self):
-        self.EDGE_FORMAT, VALUES = self._parse_fields(self.edge_class)
-        self.EDGE = pack(self.EDGE_FORMAT, *VALUES)
+        self.EDGE_FORMAT, VALUES, self.EDGE_FIELDS = self._parse_fields(
+            self.edge_class)
+        self.EDGE_STRUCT = Struct(self.EDGE_FORMAT)
+        self.EDGE = self.EDGE_STRUCT.pack(*VALUES)
+        self._pack_edge, self._decode_edge = self._compile_codecs(
+            self.edge_class, self.EDGE_STRUCT)
+
+        # only read the fields needed to walk the out and in trees
+        self.EDGE_OUT_STRUCT = self._fields_struct(
+            self.EDGE_FIELDS, ("hash", "out_edge_left", "out_edge_right"))
+        self.EDGE_IN_STRUCT = self._fields_struct(
+            self.EDGE_FIELDS, ("hash", "in_edge_left", "in_edge_right"))
+        # and only the endpoints when listing edges
+        self.EDGE_ENDS_STRUCT = self._fields_struct(
+            self.EDGE_FIELDS, ("source_position", "target_position"))
+        # and an endpoint along with the links when listing neighbors
+        self.EDGE_OUT_NEIGHBOR_STRUCT = self._fields_struct(
+            self.EDGE_FIELDS,
+            ("target_position", "out_edge_left", "out_edge_right"))
+        self.EDGE_IN_NEIGHBOR_STRUCT = self._fields_struct(
+            self.EDGE_FIELDS,
+            ("source_position", "in_edge_left", "in_edge_right"))
+        # fields ordering edges of equal hashes (see compare_edges)
+        self.EDGE_ORDER_STRUCT = self._fields_struct(
+            self.EDGE_FIELDS, ("source_position", "target_position", "type"))
         self.EDGE_SIZE = len(self.EDGE)
+        # records are packed aside first (see _set_edge_at)
+        self._edge_buffer = bytearray(self.EDGE_SIZE)
 
     def _init_node_size(self):
-        self.NODE_FORMAT, VALUES = self._parse_fields(self.node_class)
+        self.NODE_FORMAT, VALUES, self.NODE_FIELDS = self._parse_fields(
+            self.node_class)
         VALUES[0] = 1  # boolean that indicates that item is node
-        self.NODE = pack(self.NODE_FORMAT, *VALUES)
+        self.NODE_STRUCT = Struct(self.NODE_FORMAT)
+        self.NODE = self.NODE_STRUCT.pack(*VALUES)
+        self._pack_node, self._decode_node = self._compile_codecs(
+            self.node_class, self.NODE_STRUCT)
         self.NODE_SIZE = len(self.NODE)
+        self._node_buffer = bytearray(self.NODE_SIZE)
 
         self.NODE_TO_EDGE_RATIO = math.ceil(self.NODE_SIZE / self.EDGE_SIZE)
-        self.NODE_PLACEHOLDER_SIZE = self.NODE_TO_EDGE_RATIO * self.EDGE_SIZE
-        # pad placeholder with 0s
-        self.NODE_PLACEHOLDER = self.NODE + b"\x00" * (
-            self.NODE_PLACEHOLDER_SIZE - self.NODE_SIZE)
 
-        # get node_tree_info  format
-        self.NODE_TREE_FORMAT = (
-            2 * self.bool_format + self.hash_format + 2 * self.int_format)
-        self.NODE_TREE = pack(self.NODE_TREE_FORMAT, 0, 0, 0, 0, 0)
-        self.NODE_TREE_SIZE = len(self.NODE_TREE)
+        # only read the fields needed to walk the node tree
+        self.NODE_TREE_STRUCT = self._fields_struct(
+            self.NODE_FIELDS, ("hash", "left", "right"))
+        # links and key only, when listing nodes
+        self.NODE_WALK_STRUCT = self._fields_struct(
+            self.NODE_FIELDS, ("left", "right", "key"))
 
     def _init_header_size(self):
         HEADER_FORMAT = ""
@@ -272,9 +432,23 @@ class Graph:
             else:
                 HEADER_VALUES.append(0)
         self.HEADER_FORMAT = HEADER_FORMAT
-        self.HEADER = pack(HEADER_FORMAT, *HEADER_VALUES)
+        self.HEADER_STRUCT = Struct(HEADER_FORMAT)
+        self.HEADER = self.HEADER_STRUCT.pack(*HEADER_VALUES)
+        # the header is only written field by field (see _write_counts and
+        # _write_header_field): only its decoder is needed
+        _, self._decode_header = self._compile_codecs(
+            Header, self.HEADER_STRUCT)
         self.HEADER_SIZE = len(self.HEADER)
 
+        # the counters changed by insertions and removals lead the header:
+        # n_nodes, n_edges, node_id and next_table_position
+        self.HEADER_COUNTS_STRUCT = Struct(4 * self.int_format)
+        # all header fields are ints: single fields are written in place
+        self.INT_STRUCT = Struct(self.int_format)
+        self.HEADER_OFFSETS = {
+            name: i * self.INT_STRUCT.size
+            for i, name in enumerate(Header.__dataclass_fields__)}
+
     # =========================================================================
     # File & memory management
     # =========================================================================
@@ -290,20 +464,31 @@ class Graph:
         if not os.path.exists(self.filename) or self.flag == "n":
             with open(self.filename, "wb") as f:
                 f.write(self.HEADER)
-                f.write(self.NODE_PLACEHOLDER)
-                f.write(self.EDGE * self.table_increment)
+                # empty slots are all zeros: extend the file rather than
+                # writing them (see _grow); the root node is set below
+                f.truncate(self.HEADER_SIZE + self.EDGE_SIZE * (
+                    self.NODE_TO_EDGE_RATIO + self.table_increment))
             self._map_to_memory()
             self._get_sizes()
 
             # insert immovable root node
-            root = self.node_class(hash=2147483648)
+            # the root sits in the middle of the range of hashes: 0 for
+            # signed (lowercase) formats, 2**(bits-1) for unsigned ones
+            if self.hash_format.islower():
+                root_hash = 0
+            else:
+                root_hash = 1 << (8 * calcsize(self.hash_format) - 1)
+            root = self.node_class(hash=root_hash)
             self._set_node_at(root, 0)
         else:
             self._map_to_memory()
             self._get_sizes()
             if self.preload:
-                for _ in self.nodes:
-                    pass
+                # load node attributes into the caches in table order rather
+                # than tree order, so that the table is read sequentially
+                # (and ahead by the kernel)
+                self._prefetch(0, self.header.next_table_position)
+                self.batch_get_nodes(batch_size=self.n_nodes)
 
     def _map_to_memory(self):
         with open(self.filename, "r+b") as f:
@@ -311,98 +496,147 @@ class Graph:
                 self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
             else:
                 self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # tree walks jump across the table: do not read ahead around every
+        # page fault (table scans prefetch explicitly, see _prefetch)
+        if hasattr(mmap, "MADV_RANDOM"):
+            self.mm.madvise(mmap.MADV_RANDOM)
+
+    def _prefetch(self, position, n_slots):
+        # ask the kernel to asynchronously read ahead the given slots
+        if not hasattr(mmap, "MADV_WILLNEED"):
+            return
+        start = position * self.EDGE_SIZE + self.HEADER_SIZE
+        start -= start % mmap.PAGESIZE
+        end = min(
+            len(self.mm),
+            (position + n_slots) * self.EDGE_SIZE + self.HEADER_SIZE)
+        if end > start:
+            self.mm.madvise(mmap.MADV_WILLNEED, start, end - start)
 
     def _expand(self):
         if (
             self.header.next_table_position
-            <= self.header.table_size - 0.1 * self.table_increment
+            > self.header.table_size - 0.1 * self.table_increment
         ):
-            self.mm[: self.HEADER_SIZE] = pack(
-                self.HEADER_FORMAT, *self._parse_values(self.header))
-            return
-
-        with open(self.filename, "ab") as f:
-            f.write(self.EDGE * self.table_increment)
+            # at least double the table, so that a bulk load only grows
+            # (and remaps) the file a logarithmic number of times
+            self._grow(max(1, self.header.table_size // self.table_increment))
+
+    def _reserve(self, n_slots):
+        # grow the file at once so that n_slots more slots fit in, instead of
+        # letting _expand grow it one increment at a time
+        missing = (self.header.next_table_position + n_slots -
+                   self.header.table_size + 0.1 * self.table_increment)
+        if missing > 0:
+            # still at least double the table, so that many small batches
+            # do not each grow the file
+            self._grow(max(math.ceil(missing / self.table_increment),
+                           self.header.table_size // self.table_increment))
+
+    def _grow(self, n_increments):
+        # empty slots are all zeros (see self.EDGE): extend the file with 0s
+        self.header.table_size += n_increments * self.table_increment
+        size = self.HEADER_SIZE + self.header.table_size * self.EDGE_SIZE
+        try:
+            # truncates the file and remaps it in place (mremap)
+            self.mm.resize(size)
+        except (BufferError, OSError, SystemError, TypeError):
+            with open(self.filename, "r+b") as f:
+                f.truncate(size)
+            self._map_to_memory()
+        self._write_header_field("table_size", self.header.table_size)
 
-        # add increment to table_size
-        self.header.table_size += self.table_increment
-        self.mm[:self.HEADER_SIZE] = pack(
-            self.HEADER_FORMAT, *self._parse_values(self.header))
-        self._map_to_memory()
+    def _write_header_field(self, name, value):
+        self.INT_STRUCT.pack_into(self.mm, self.HEADER_OFFSETS[name], value)
 
     def _increment_node(self, recycled):
-        self.header.n_nodes += 1
-        self.header.node_id += 1
+        # a node always comes with its dummy edge: counts are written once,
+        # by the _increment_edge call that follows in _insert_node
+        header = self.header
+        header.n_nodes += 1
+        header.node_id += 1
         if not recycled:
-            self.header.next_table_position += self.NODE_TO_EDGE_RATIO
-        self._expand()
+            header.next_table_position += self.NODE_TO_EDGE_RATIO
+            self._expand()
 
     def _increment_edge(self, recycled):
-        self.header.n_edges += 1
+        header = self.header
+        header.n_edges += 1
         if not recycled:
-            self.header.next_table_position += 1
-        self._expand()
+            header.next_table_position += 1
+            self._expand()
+        self._write_counts()
 
     def _decrement_edge(self):
         self.header.n_edges -= 1
-        self._expand()
+        self._write_counts()
 
     def _decrement_node(self):
+        # counts are written by the _decrement_edge of the dummy edge, that
+        # follows in _erase_node
         self.header.n_nodes -= 1
-        self._expand()
+
+    def _write_counts(self):
+        # write the leading counters of the header, rather than all of it
+        header = self.header
+        self.HEADER_COUNTS_STRUCT.pack_into(
+            self.mm, 0, header.n_nodes, header.n_edges, header.node_id,
+            header.next_table_position)
 
     def _cache_node(self, node):
-        nkey, npos, nindex, nhash, nleft, nright = (
-            node.key, node.position, node.index,
-            node.hash, node.left, node.right)
+        nkey, npos, nhash, nleft, nright = (
+            node.key, node.position, node.hash, node.left, node.right)
 
         self.cache_key_to_pos[nkey] = npos
-        self.cache_id_to_key[nindex] = nkey
         self.cache_pos_to_node[npos] = node
         self.cache_pos_to_node_tree[npos] = (nhash, nleft, nright)
 
     def _uncache_node(self, node):
         npos = node.position
-        try:
-            del self.cache_key_to_pos[node.key]
-        except KeyError:
-            pass
-        try:
-            del self.cache_id_to_key[node.index]
-        except KeyError:
-            pass
-        try:
-            del self.cache_pos_to_node[npos]
-        except KeyError:
-            pass
-        try:
-            del self.cache_pos_to_node_tree[npos]
-        except KeyError:
-            pass
+        self.cache_key_to_pos.pop(node.key, None)
+        self.cache_pos_to_node.pop(npos, None)
+        self.cache_pos_to_node_tree.pop(npos, None)
 
     def empty_cache(self):
-        self.cache_id_to_key = LRUCache(self.cache_len)
-        self.cache_key_to_pos = LRUCache(self.cache_len)
-        self.cache_pos_to_node = LRUCache(self.cache_len)
-        self.cache_pos_to_node_tree = LRUCache(self.cache_len)
+        self.cache_key_to_pos = Cache(self.cache_len)
+        self.cache_pos_to_node = Cache(self.cache_len)
+        self.cache_pos_to_node_tree = Cache(self.cache_len)
         self._get_sizes()
 
     def find_tombstones(self):
+        try:
+            import numpy as np
+            table, is_node, is_edge = self._view_table(
+                ("exists",), self.header.next_table_position)
+        except ImportError:
+            # NumPy is optional: fall back to reading the flags slot by slot
+            self._find_tombstones()
+            return
+
+        # erased records keep their is_node flag, but not their exists flag
+        erased = ~table["exists"]
+        self.node_tombstone = np.flatnonzero(is_node & erased).tolist()
+        self.edge_tombstone = np.flatnonzero(is_edge & erased).tolist()
+
+    def _find_tombstones(self):
         EDGE_SIZE = self.EDGE_SIZE
         HEADER_SIZE = self.HEADER_SIZE
         NODE_TO_EDGE_RATIO = self.NODE_TO_EDGE_RATIO
+        mm = self.mm
+
+        self.node_tombstone = []
+        self.edge_tombstone = []
+        self._prefetch(0, self.header.next_table_position)
         position = 0
-        size = len(pack("?" + self.int_format, 0, 0))
-        while position <= self.header.next_table_position:
+        while position < self.header.next_table_position:
             ind = position * EDGE_SIZE + HEADER_SIZE
-            is_node, index = unpack("?" + self.int_format,
-                                    self.mm[ind: ind + size])
-            if is_node:
-                if index == 0:
+            # is_node and exists are the first two bytes of any record
+            if mm[ind]:
+                if not mm[ind + 1]:
                     self.node_tombstone.append(position)
                 position += NODE_TO_EDGE_RATIO
             else:
-                if index == 0:
+                if not mm[ind + 1]:
                     self.edge_tombstone.append(position)
                 position += 1
 
@@ -410,120 +644,207 @@ class Graph:
     # Tree traversal
     # =========================================================================
 
-    def _iter_edges(self):
+    def _iter_edges(self, batch_size=1024):
         EDGE_SIZE = self.EDGE_SIZE
+        unpack_edge = self.EDGE_STRUCT.unpack_from
         HEADER_SIZE = self.HEADER_SIZE
         NODE_TO_EDGE_RATIO = self.NODE_TO_EDGE_RATIO
+        decode_edge = self._decode_edge
 
+        self._prefetch(0, self.header.next_table_position + 1)
         position = 0
         while position <= self.header.next_table_position:
-            ind = position * EDGE_SIZE + HEADER_SIZE
-            is_node, exists = unpack("??", self.mm[ind: ind + 2])
-            if is_node:
-                position += NODE_TO_EDGE_RATIO
-            else:
-                if not exists:
-                    position += 1
+            # read a whole batch of slots at once and decode from the buffer
+            start = position
+            end = min(start + batch_size, self.header.next_table_position + 1)
+            ind = start * EDGE_SIZE + HEADER_SIZE
+            buffer = self.mm[ind: ind + (end - start) * EDGE_SIZE]
+            while position < end:
+                offset = (position - start) * EDGE_SIZE
+                if buffer[offset]:  # is_node
+                    position += NODE_TO_EDGE_RATIO
                     continue
 
-                edge = self._get_edge_at(position)
                 position += 1
-                if edge.is_edge_start:
+                if not buffer[offset + 1] or buffer[offset + 2]:
+                    continue  # erased, or dummy edge (is_edge_start)
+
+                yield decode_edge(unpack_edge(buffer, offset))
+
+    def _scan_edges(self, *fields):
+        """Read the given fields of all edges as NumPy arrays
+
+        The table is viewed in place as a structured array (one record per
+        slot), so that no Edge object is built.
+
+        Args:
+            fields (str): names of the (scalar) edge fields to read
+
+        Returns:
+            numpy.ndarray: structured array of the edges, with given fields
+        """
+        edges, _ = self._scan_window(fields, 0, self._n_slots())
+        return edges
+
+    def _scan_window(self, fields, start, stop):
+        # read the given fields of the edges in the slots [start, stop), and
+        # the position where the next window starts: past stop when the last
+        # node of the window spans beyond it. start must be a record start
+        import numpy as np
+
+        table, is_node, is_edge = self._view_table(
+            ("exists", "is_edge_start") + fields, stop - start, start)
+
+        # boolean indexing copies, so that no view of the mmap outlives
+        # this call (an exported buffer would prevent resizing the file)
+        mask = is_edge & table["exists"] & ~table["is_edge_start"]
+        edges = table[list(fields)][mask]
+
+        next_start = stop
+        if self.NODE_TO_EDGE_RATIO > 1:
+            node_starts = np.flatnonzero(is_node)
+            if len(node_starts):
+                next_start = max(stop, start + int(node_starts[-1]) +
+                                 self.NODE_TO_EDGE_RATIO)
+        return edges, next_start
+
+    def _n_slots(self):
+        # number of used slots, bounded by the size of the map
+        return min(self.header.next_table_position + 1,
+                   (len(self.mm) - self.HEADER_SIZE) // self.EDGE_SIZE)
+
+    def _view_table(self, names, n_slots, start=0):
+        # view n_slots slots of the table from start, in place, as a NumPy
+        # structured array of the given edge fields (one record per slot),
+        # along with the masks of the slots starting a node, and of the
+        # slots holding an edge
+        import numpy as np
+
+        names = ("is_node",) + names
+        dtype = np.dtype({
+            "names": names,
+            "formats": [self.EDGE_FIELDS[name][1] for name in names],
+            "offsets": [self.EDGE_FIELDS[name][0] for name in names],
+            "itemsize": self.EDGE_SIZE})
+        self._prefetch(start, n_slots)
+        table = np.frombuffer(
+            self.mm, dtype=dtype, count=n_slots,
+            offset=self.HEADER_SIZE + start * self.EDGE_SIZE)
+
+        # a node spans NODE_TO_EDGE_RATIO slots: only the first one is
+        # flagged, the others hold node data that must not be read as records
+        is_node = table["is_node"].copy()
+        is_edge = ~is_node
+        if self.NODE_TO_EDGE_RATIO > 1:
+            next_position = 0
+            for position in np.flatnonzero(is_node).tolist():
+                if position < next_position:
+                    is_node[position] = False
                     continue
-                yield edge
+                next_position = position + self.NODE_TO_EDGE_RATIO
+                is_edge[position:next_position] = False
+        return table, is_node, is_edge
 
     def _find_node_pos(self, position, new_node):
-        _get_node_at = self._get_node_at
+        # walk the tree on (hash, left, right) triples, served from the cache
+        # when possible: a node is only decoded when hashes are equal, and at
+        # the final position
+        get_tree_info = self.cache_pos_to_node_tree.get
         _get_node_tree_info_at = self._get_node_tree_info_at
-
-        current_hash, current_left, current_right = (
-            _get_node_tree_info_at(position))
+        _get_node_at = self._get_node_at
         new_node_hash = new_node.hash
 
         while 1:
-            if new_node_hash < current_hash:
+            tree_info = get_tree_info(position)
+            if tree_info is None:
+                tree_info = _get_node_tree_info_at(position)
+            current_hash, left, right = tree_info
+            if new_node_hash < current_hash:  # go left
                 state = -1
-            elif new_node_hash > current_hash:
+                child = left
+            elif new_node_hash > current_hash:  # go right
                 state = 1
+                child = right
             else:
                 current_node = _get_node_at(position)
-                state = compare_nodes(current_node.hash,
-                                      current_node.key, new_node)
+                state = compare_nodes(
+                    current_node.hash, current_node.key, new_node)
+                if state == 0:  # is equal
+                    break
+                child = left if state == -1 else right
 
-            if state == -1:
-                if current_left != 0:
-                    position = current_left
-                    current_hash, current_left, current_right = (
-                        _get_node_tree_info_at(position))
-                    continue
-                break
-            elif state == 1:
-                if current_right != 0:
-                    position = current_right
-                    current_hash, current_left, current_right = (
-                        _get_node_tree_info_at(position))
-                    continue
-                break
-            else:  # is equal
+            if child == 0:
                 break
-        current_node = _get_node_at(position)
-        return current_node, state
+            position = child
+        return _get_node_at(position), state
 
     def _find_edge_out_pos(self, position, new_edge):
-        _get_edge_at = self._get_edge_at
-
-        current_edge = _get_edge_at(position)
-        while 1:
-            state = compare_edges(current_edge, new_edge)
-            if state == -1:  # go left
-                if current_edge.out_edge_left != 0:
-                    position = current_edge.out_edge_left
-                    current_edge = _get_edge_at(position)
-                    continue
-                break
-            elif state == 1:  # go right
-                if current_edge.out_edge_right != 0:
-                    position = current_edge.out_edge_right
-                    current_edge = _get_edge_at(position)
-                    continue
-                break
-            else:  # is equal
-                break
-        return current_edge, state
+        return self._find_edge_pos(position, new_edge, self.EDGE_OUT_STRUCT)
 
     def _find_edge_in_pos(self, position, new_edge):
-        _get_edge_at = self._get_edge_at
+        return self._find_edge_pos(position, new_edge, self.EDGE_IN_STRUCT)
+
+    def _find_edge_pos(self, position, new_edge, LINKS_STRUCT):
+        # walk the tree reading only hashes and child positions, and the
+        # fields breaking ties when hashes are equal (see compare_edges):
+        # returns the position where the search stopped, and the state
+        unpack_links = LINKS_STRUCT.unpack_from
+        unpack_order = self.EDGE_ORDER_STRUCT.unpack_from
+        mm = self.mm
+        EDGE_SIZE = self.EDGE_SIZE
+        HEADER_SIZE = self.HEADER_SIZE
+        new_edge_hash = new_edge.hash
+        new_edge_order = None
 
-        current_edge = _get_edge_at(position)
         while 1:
-            state = compare_edges(current_edge, new_edge)
-            if state == -1:  # go left
-                if current_edge.in_edge_left != 0:
-                    position = current_edge.in_edge_left
-                    current_edge = _get_edge_at(position)
-                    continue
-                break
-            elif state == 1:  # go right
-                if current_edge.in_edge_right != 0:
-                    position = current_edge.in_edge_right
-                    current_edge = _get_edge_at(position)
-                    continue
-                break
-            else:  # is equal
+            ind = position * EDGE_SIZE + HEADER_SIZE
+            current_hash, left, right = unpack_links(mm, ind)
+            if new_edge_hash < current_hash:  # go left
+                state = -1
+                child = left
+            elif new_edge_hash > current_hash:  # go right
+                state = 1
+                child = right
+            else:
+                if new_edge_order is None:
+                    new_edge_order = (new_edge.source_position,
+                                      new_edge.target_position,
+                                      new_edge.type)
+                state = compare_edge_ties(
+                    unpack_order(mm, ind), new_edge_order)
+                if state == 0:  # is equal
+                    break
+                child = left if state == -1 else right
+
+            if child == 0:
                 break
-        return current_edge, state
+            position = child
+        return position, state
 
     def _find_inorder_successor_edge(self, edge, out=True):
-        _get_edge_at = self._get_edge_at
+        # follow left links through the right subtree reading only the links,
+        # then decode the successor and its parent
+        if out:
+            position = edge.out_edge_right
+            unpack_links = self.EDGE_OUT_STRUCT.unpack_from
+        else:
+            position = edge.in_edge_right
+            unpack_links = self.EDGE_IN_STRUCT.unpack_from
+        mm = self.mm
+        EDGE_SIZE = self.EDGE_SIZE
+        HEADER_SIZE = self.HEADER_SIZE
 
-        edge_right = edge.out_edge_right if out else edge.in_edge_right
-        left = "out_edge_left" if out else "in_edge_left"
-        successor = _get_edge_at(edge_right)
-        antecedent = edge
-        while getattr(successor, left) != 0:
-            antecedent = successor
-            successor = _get_edge_at(getattr(successor, left))
-        return (successor, antecedent)
+        antecedent = None
+        while 1:
+            _, left, _ = unpack_links(mm, position * EDGE_SIZE + HEADER_SIZE)
+            if left == 0:
+                break
+            antecedent, position = position, left
+
+        successor = self._get_edge_at(position)
+        if antecedent is None:
+            return (successor, edge)
+        return (successor, self._get_edge_at(antecedent))
 
     def _find_inorder_successor_node(self, node):
         _get_node_at = self._get_node_at
@@ -536,81 +857,127 @@ class Graph:
         return (successor, antecedent)
 
     def _node_dfs(self, node):
-        if node.index != 0:
-            yield node
+        # iterative pre-order traversal, with an explicit stack of nodes
+        # (_get_node_at caches the nodes it reads)
+        _get_node_at = self._get_node_at
 
-        # store in cache
-        self._cache_node(node)
+        stack = [node]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node = pop()
+            if node.index != 0:
+                yield node
 
-        if node.left != 0:
-            yield from self._node_dfs(self._get_node_at(node.left))
-        if node.right != 0:
-            yield from self._node_dfs(self._get_node_at(node.right))
+            if node.right != 0:
+                push(_get_node_at(node.right))
+            if node.left != 0:
+                push(_get_node_at(node.left))
 
     def _edge_out_dfs(self, edge):
-        if edge.out_edge_left != 0:
-            yield from self._edge_out_dfs(
-                self._get_edge_at(edge.out_edge_left))
-        if edge.out_edge_right != 0:
-            yield from self._edge_out_dfs(
-                self._get_edge_at(edge.out_edge_right))
-        if not edge.is_edge_start:
-            yield edge
+        # iterative post-order traversal: an edge is pushed a first time to
+        # push its children, then a second time to be yielded after them
+        _get_edge_at = self._get_edge_at
+
+        stack = [(edge, False)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            edge, visited = pop()
+            if visited:
+                if not edge.is_edge_start:
+                    yield edge
+                continue
+
+            push((edge, True))
+            if edge.out_edge_right != 0:
+                push((_get_edge_at(edge.out_edge_right), False))
+            if edge.out_edge_left != 0:
+                push((_get_edge_at(edge.out_edge_left), False))
 
     def _edge_in_dfs(self, edge):
-        if edge.in_edge_left != 0:
-            yield from self._edge_in_dfs(self._get_edge_at(edge.in_edge_left))
-        if edge.in_edge_right != 0:
-            yield from self._edge_in_dfs(self._get_edge_at(edge.in_edge_right))
-        if not edge.is_edge_start:
-            yield edge
+        # same as _edge_out_dfs, along the in-edge tree
+        _get_edge_at = self._get_edge_at
+
+        stack = [(edge, False)]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            edge, visited = pop()
+            if visited:
+                if not edge.is_edge_start:
+                    yield edge
+                continue
+
+            push((edge, True))
+            if edge.in_edge_right != 0:
+                push((_get_edge_at(edge.in_edge_right), False))
+            if edge.in_edge_left != 0:
+                push((_get_edge_at(edge.in_edge_left), False))
+
+    def _neighbor_dfs(self, start, NEIGHBOR_STRUCT):
+        # same traversal as _edge_out_dfs and _edge_in_dfs, yielding the
+        # neighbor positions only: each edge is read as (endpoint, left,
+        # right), and the endpoint is pushed back as ~endpoint to be yielded
+        # once the children are done
+        unpack_neighbor = NEIGHBOR_STRUCT.unpack_from
+        EDGE_SIZE = self.EDGE_SIZE
+        HEADER_SIZE = self.HEADER_SIZE
+
+        stack = [start]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            position = pop()
+            if position < 0:
+                yield ~position
+                continue
+
+            endpoint, left, right = unpack_neighbor(
+                self.mm, position * EDGE_SIZE + HEADER_SIZE)
+            if position != start:  # skip the dummy edge
+                push(~endpoint)
+            if right != 0:
+                push(right)
+            if left != 0:
+                push(left)
+
+    # only the links change when unplugging and rewiring: they are written
+    # in place rather than packing the whole records again
 
     def _unplug_edge(self, parent, state, out=True):
         if state == -1:  # edge came from left
-            if out:
-                parent.out_edge_left = 0
-            else:
-                parent.in_edge_left = 0
+            link = "out_edge_left" if out else "in_edge_left"
         else:
-            if out:
-                parent.out_edge_right = 0
-            else:
-                parent.in_edge_right = 0
-        self._set_edge_at(parent, parent.position)
+            link = "out_edge_right" if out else "in_edge_right"
+        setattr(parent, link, 0)
+        self._set_edge_link(parent.position, link, 0)
 
     def _unplug_node(self, parent, state):
-        if state == -1:
-            parent.left = 0
-        else:
-            parent.right = 0
-        self._set_node_at(parent, parent.position)
+        link = "left" if state == -1 else "right"
+        setattr(parent, link, 0)
+        self._set_node_link(parent.position, link, 0)
+        self._cache_node(parent)
 
     def _rewire_edge(self, parent, child, state, out=True):
         if state == -1:
-            if out:
-                parent.out_edge_left = child.position
-            else:
-                parent.in_edge_left = child.position
+            link = "out_edge_left" if out else "in_edge_left"
         else:
-            if out:
-                parent.out_edge_right = child.position
-            else:
-                parent.in_edge_right = child.position
-        if out:
-            child.out_edge_parent = parent.position
-        else:
-            child.in_edge_parent = parent.position
-        self._set_edge_at(parent, parent.position)
-        self._set_edge_at(child, child.position)
+            link = "out_edge_right" if out else "in_edge_right"
+        up = "out_edge_parent" if out else "in_edge_parent"
+        setattr(parent, link, child.position)
+        setattr(child, up, parent.position)
+        self._set_edge_link(parent.position, link, child.position)
+        self._set_edge_link(child.position, up, parent.position)
 
     def _rewire_node(self, parent, child, state):
-        if state == -1:
-            parent.left = child.position
-        else:
-            parent.right = child.position
+        link = "left" if state == -1 else "right"
+        setattr(parent, link, child.position)
         child.parent = parent.position
-        self._set_node_at(parent, parent.position)
-        self._set_node_at(child, child.position)
+        self._set_node_link(parent.position, link, child.position)
+        self._set_node_link(child.position, "parent", parent.position)
+        self._cache_node(parent)
+        self._cache_node(child)
 
     def _remove_node_from_tree(self, node):
         parent = self._get_node_at(node.parent)
@@ -699,9 +1066,7 @@ class Graph:
         # case 1: edge to remove has no child
         if edge_left == 0 and edge_right == 0:
             if parent.position < 0:
-                print(edge)
-                print(parent)
-                raise ValueError
+                raise ValueError(f"edge {edge} has no valid parent: {parent}")
             self._unplug_edge(parent, state, out)
         # case 2: edge to remove has only one child
         elif edge_left == 0:
@@ -782,17 +1147,14 @@ class Graph:
         return self.edge_tombstone.pop(0), recycled
 
     def _get_sizes(self):
-        data = unpack(self.HEADER_FORMAT, self.mm[:self.HEADER_SIZE])
-        self.header = Header(*data)
+        self.header = self._decode_header(
+            self.HEADER_STRUCT.unpack_from(self.mm))
 
     def _get_node_tree_info_at(self, position):
-        data = self.cache_pos_to_node_tree.get(position)
-        if data is not None:
-            return data
-
+        # read (hash, left, right) from the table and cache it: the cache
+        # itself is looked up by the caller (_find_node_pos)
         ind = position * self.EDGE_SIZE + self.HEADER_SIZE
-        _, _, hash, left, right = unpack(
-            self.NODE_TREE_FORMAT, self.mm[ind: ind + self.NODE_TREE_SIZE])
+        hash, left, right = self.NODE_TREE_STRUCT.unpack_from(self.mm, ind)
         self.cache_pos_to_node_tree[position] = hash, left, right
         return hash, left, right
 
@@ -803,39 +1165,26 @@ class Graph:
 
         ind = position * self.EDGE_SIZE + self.HEADER_SIZE
         try:
-            data = unpack(self.NODE_FORMAT, self.mm[ind: ind + self.NODE_SIZE])
+            data = self.NODE_STRUCT.unpack_from(self.mm, ind)
         except error:
             self._map_to_memory()
-            data = unpack(self.NODE_FORMAT, self.mm[ind: ind + self.NODE_SIZE])
+            data = self.NODE_STRUCT.unpack_from(self.mm, ind)
 
-        i = 0
-        res = []
-        append = res.append
-        for field in self.node_class.__dataclass_fields__.values():
-            if field.type != tuple and field.type != str:
-                append(data[i])
-                i += 1
-            elif field.name == "key":
-                append(to_string(data[i: i + self.max_key_len]))
-                i += self.max_key_len
-            elif field.type == str:
-                append(to_string(data[i: i + self.max_str_len]))
-                i += self.max_str_len
-        node = self.node_class(*res)
+        node = self._decode_node(data)
 
-        if node.index not in self.cache_id_to_key:
+        # erased slots all decode to the same keyless node
+        if node.exists:
             self._cache_node(node)
         return node
 
     def _get_edge_at(self, position):
         ind = position * self.EDGE_SIZE + self.HEADER_SIZE
-        data = unpack(self.EDGE_FORMAT, self.mm[ind: ind + self.EDGE_SIZE])
-        edge = self.edge_class(*data)
-        return edge
+        return self._decode_edge(self.EDGE_STRUCT.unpack_from(self.mm, ind))
 
     def _get_edge_hash(self, source, target, edge_type):
-        return self.hash_func(
-            "_".join((str(source.hash), str(edge_type), str(target.hash))))
+        # hashes are persisted in the edge trees: the hashed string must stay
+        # the same as in existing databases
+        return self.hash_func(f"{source.hash}_{edge_type}_{target.hash}")
 
     def _get_keys_from_edge(self, edge):
         src_pos = edge.source_position
@@ -853,6 +1202,11 @@ class Graph:
         """Closes database file."""
         self.mm.close()
 
+    def flush(self):
+        """Writes pending changes to disk. The database stays open, so that
+        the graph can keep being used without being reopened."""
+        self.mm.flush()
+
     def neighbors(self, u):
         """Iterate over all nodes v such that (u, v) is an edge
 
@@ -862,11 +1216,10 @@ class Graph:
         Yields:
             iterator: iterator of node keys
         """
-        leaf = self.node(u)
-        start = self._get_edge_at(leaf.edge_start)
-        for edge in self._edge_out_dfs(start):
-            res = self._get_node_at(edge.target_position)
-            yield res.key
+        _get_node_at = self._get_node_at
+        for position in self._neighbor_dfs(
+                self.node(u).edge_start, self.EDGE_OUT_NEIGHBOR_STRUCT):
+            yield _get_node_at(position).key
 
     def predecessors(self, v):
         """Iterate over all nodes u such that (u, v) is an edge
@@ -877,11 +1230,10 @@ class Graph:
         Yields:
             iterator: iterator of node keys
         """
-        leaf = self.node(v)
-        start = self._get_edge_at(leaf.edge_start)
-        for edge in self._edge_in_dfs(start):
-            res = self._get_node_at(edge.source_position)
-            yield res.key
+        _get_node_at = self._get_node_at
+        for position in self._neighbor_dfs(
+                self.node(v).edge_start, self.EDGE_IN_NEIGHBOR_STRUCT):
+            yield _get_node_at(position).key
 
     def set_neighbors(self, u, new_neighbors):
         """Strictly assign predecessors to a node
@@ -965,9 +1317,34 @@ class Graph:
         Returns:
             set: the set of all common neighbors
         """
-        u_nbs = set(self.neighbors(u))
-        v_nbs = set(self.neighbors(v))
-        return u_nbs.intersection(v_nbs)
+        # intersect table positions, then only read the keys of the result
+        common = self._neighbor_positions(u) & self._neighbor_positions(v)
+        _get_node_at = self._get_node_at
+        return {_get_node_at(position).key for position in common}
+
+    def common_neighbors_many(self, pairs):
+        """Returns the sets of common neighbors for many pairs of nodes
+
+        The neighborhood of each node is only read once, however many pairs
+        it belongs to.
+
+        Args:
+            pairs (list): list of (u, v) tuples of node keys
+        Returns:
+            list: the set of all common neighbors of each pair
+        """
+        _get_node_at = self._get_node_at
+        _neighbor_positions = self._neighbor_positions
+
+        positions = {}
+        results = []
+        for u, v in pairs:
+            for key in (u, v):
+                if key not in positions:
+                    positions[key] = _neighbor_positions(key)
+            common = positions[u] & positions[v]
+            results.append({_get_node_at(p).key for p in common})
+        return results
 
     def common_predecessors(self, u, v):
         """Returns the set of common predecessors between two nodes
@@ -978,29 +1355,56 @@ class Graph:
         Returns:
             set: the set of all common predecessors
         """
-        u_nbs = set(self.predecessors(u))
-        v_nbs = set(self.predecessors(v))
-        return u_nbs.intersection(v_nbs)
+        common = (self._predecessor_positions(u) &
+                  self._predecessor_positions(v))
+        _get_node_at = self._get_node_at
+        return {_get_node_at(position).key for position in common}
+
+    def _neighbor_positions(self, u):
+        # table positions of the neighbors of u
+        return set(self._neighbor_dfs(
+            self.node(u).edge_start, self.EDGE_OUT_NEIGHBOR_STRUCT))
+
+    def _predecessor_positions(self, v):
+        # table positions of the predecessors of v
+        return set(self._neighbor_dfs(
+            self.node(v).edge_start, self.EDGE_IN_NEIGHBOR_STRUCT))
 
     def out_degree(self, key):
         # returns out-degree
-        count = 0
-        for _ in self.neighbors(key):
-            count += 1
-        return count
+        return self._count_edges(self.node(key), self.EDGE_OUT_STRUCT)
 
     def in_degree(self, key):
         # returns in-degree
-        count = 0
-        for _ in self.predecessors(key):
+        return self._count_edges(self.node(key), self.EDGE_IN_STRUCT)
+
+    def _count_edges(self, node, LINKS_STRUCT):
+        # size of the edge tree of node, walking the child links without
+        # decoding any edge, minus its dummy edge
+        unpack_links = LINKS_STRUCT.unpack_from
+        mm = self.mm
+        EDGE_SIZE = self.EDGE_SIZE
+        HEADER_SIZE = self.HEADER_SIZE
+
+        count = -1
+        stack = [node.edge_start]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            _, left, right = unpack_links(
+                mm, pop() * EDGE_SIZE + HEADER_SIZE)
             count += 1
+            if left != 0:
+                push(left)
+            if right != 0:
+                push(right)
         return count
 
     def node(self, key):
         """Get node from key
 
         Args:
-            key (str): unique string identifier of the node
+            key (str or bytes): unique string identifier of the node
 
         Raises:
             NodeNotFound: the key does not match any node in the graph
@@ -1011,30 +1415,57 @@ class Graph:
         # if key is already a node object
         if isinstance(key, self.node_class):
             return key
-
-        if len(key) > self.max_key_len:
-            raise KeyTooLong
+        if isinstance(key, bytes):
+            key = key.decode()
 
         # if key is in cache
-        pos = self.cache_key_to_pos.get(key)
-        if pos is not None:
-            node = self.cache_pos_to_node.get(pos)
+        position = self.cache_key_to_pos.get(key)
+        if position is not None:
+            node = self.cache_pos_to_node.get(position)
             if node is not None:
                 return node
 
-        key_hash = self.hash_func(key)
-
-        node = self.node_class(hash=key_hash, key=key)
+        if len(key) > self.max_key_len:
+            raise KeyTooLong
 
-        # unroll tree
-        position = 0
-        prev_node, state = self._find_node_pos(position, node)
+        _, prev_node, state = self._find_node(key)
         if state == 0:
             self._cache_node(prev_node)
             return prev_node
         else:
             raise NodeNotFound
 
+    def _find_node(self, key, position=0):
+        # hash key and unroll tree once: returns a new node for key, along
+        # with the node where the search stopped and the comparison state
+        new_node = self.node_class(
+            hash=self.hash_func(key), index=self.header.node_id, key=key)
+        prev_node, state = self._find_node_pos(position, new_node)
+        return new_node, prev_node, state
+
+    def _get_or_add_node(self, key):
+        # same as node, but inserts the node (without attributes) if it is
+        # missing, reusing the position found by the search
+        if isinstance(key, self.node_class):
+            return key
+        if isinstance(key, bytes):
+            key = key.decode()
+
+        position = self.cache_key_to_pos.get(key)
+        if position is not None:
+            node = self.cache_pos_to_node.get(position)
+            if node is not None:
+                return node
+
+        if len(key) > self.max_key_len:
+            raise KeyTooLong
+
+        new_node, prev_node, state = self._find_node(key)
+        if state == 0:
+            self._cache_node(prev_node)
+            return prev_node
+        return self._insert_node(new_node, prev_node, state)
+
     def edge(self, source, target, edge_type=0):
         """Get edge from source, target and edge type
 
@@ -1059,11 +1490,12 @@ class Graph:
                                    hash=self._get_edge_hash(
                                        source, target, edge_type),
                                    type=edge_type)
-        edge, state = self._find_edge_out_pos(source.edge_start, new_edge)
+        position, state = self._find_edge_out_pos(
+            source.edge_start, new_edge)
 
         # edge already exists
         if state == 0:
-            return edge
+            return self._get_edge_at(position)
         raise EdgeNotFound(f"Edge {source.key} -> {target.key} not found")
 
     def has_node(self, node):
@@ -1109,7 +1541,16 @@ class Graph:
             list[node_class]: list of nodes
             int: cursor for the next batch. Equals -1 if the end is reached
         """
+        nodes, cursor, _ = self._batch_get_nodes(batch_size, cursor, cursor)
+        return nodes, cursor
+
+    def _batch_get_nodes(self, batch_size, cursor, prefetched):
+        # the map is advised for random access: the slots are read ahead
+        # explicitly, by steps of at least the smallest span a batch can
+        # cover, from prefetched (the end of the slots already read ahead).
+        # Returns the nodes, the next cursor and the new end of read-ahead
         _get_node_at = self._get_node_at
+        _prefetch = self._prefetch
         EDGE_SIZE = self.EDGE_SIZE
         HEADER_SIZE = self.HEADER_SIZE
         NODE_TO_EDGE_RATIO = self.NODE_TO_EDGE_RATIO
@@ -1118,14 +1559,19 @@ class Graph:
         n_nodes = 0
         nodes = []
         append = nodes.append
+        span = max(batch_size * NODE_TO_EDGE_RATIO,
+                   self.READ_AHEAD // EDGE_SIZE, 1)
 
         next_table_position = self.header.next_table_position
         while (
             position <= next_table_position and
             n_nodes < batch_size
         ):
+            if position >= prefetched:
+                _prefetch(position, span)
+                prefetched = position + span
             ind = position * EDGE_SIZE + HEADER_SIZE
-            is_node, exists = unpack("??", self.mm[ind: ind + 2])
+            is_node, exists = self.mm[ind], self.mm[ind + 1]
             if is_node:
                 if not exists or position == 0:
                     position += NODE_TO_EDGE_RATIO
@@ -1138,7 +1584,7 @@ class Graph:
                 position += 1
         if position > next_table_position:
             position = -1
-        return nodes, position
+        return nodes, position, prefetched
 
     def batch_get_edges(self, batch_size=100, cursor=0):
         """Get a batch of edges starting from a given table position
@@ -1151,39 +1597,104 @@ class Graph:
             list[tuple]: list of edges (tuple of str)
             int: cursor for the next batch. Equals -1 if the end is reached
         """
-        _get_edge_at = self._get_edge_at
-        _get_keys_from_edge = self._get_keys_from_edge
+        edges, cursor, _ = self._batch_get_edges(batch_size, cursor, cursor)
+        return edges, cursor
+
+    def _batch_get_edges(self, batch_size, cursor, prefetched):
+        # same as _batch_get_nodes, for edges
+        _get_node_at = self._get_node_at
+        _prefetch = self._prefetch
+        unpack_ends = self.EDGE_ENDS_STRUCT.unpack_from
         EDGE_SIZE = self.EDGE_SIZE
         HEADER_SIZE = self.HEADER_SIZE
         NODE_TO_EDGE_RATIO = self.NODE_TO_EDGE_RATIO
+        mm = self.mm
 
         position = cursor
         n_edges = 0
         edges = []
         append = edges.append
+        span = max(batch_size, self.READ_AHEAD // EDGE_SIZE, 1)
+
         next_table_position = self.header.next_table_position
         while (
             position <= next_table_position and
             n_edges < batch_size
         ):
+            if position >= prefetched:
+                _prefetch(position, span)
+                prefetched = position + span
             ind = position * EDGE_SIZE + HEADER_SIZE
-            is_node, exists = unpack("??", self.mm[ind: ind + 2])
-            if is_node:
+            if mm[ind]:  # is_node
                 position += NODE_TO_EDGE_RATIO
-            else:
-                if not exists:
-                    position += 1
-                    continue
+                continue
 
-                edge = _get_edge_at(position)
-                position += 1
-                if edge.is_edge_start:
-                    continue
-                append(_get_keys_from_edge(edge))
-                n_edges += 1
+            position += 1
+            if not mm[ind + 1] or mm[ind + 2]:
+                continue  # erased, or dummy edge (is_edge_start)
+
+            # only the endpoints are read, no edge is decoded
+            source, target = unpack_ends(mm, ind)
+            append((_get_node_at(source).key, _get_node_at(target).key))
+            n_edges += 1
         if position > next_table_position:
             position = -1
-        return edges, position
+        return edges, position, prefetched
+
+    def iter_nodes_batches(self, batch_size=100):
+        """Iterate over all nodes, one batch at a time. Pages holding the
+        next batch are prefetched while the current one is processed.
+
+        Args:
+            batch_size (int): number of nodes per batch
+
+        Yields:
+            list[node_class]: list of nodes
+        """
+        return self._iter_batches(self._batch_get_nodes, batch_size)
+
+    def iter_edges_batches(self, batch_size=100):
+        """Iterate over all edges, one batch at a time. Pages holding the
+        next batch are prefetched while the current one is processed.
+
+        Args:
+            batch_size (int): number of edges per batch
+
+        Yields:
+            list[tuple]: list of edges (tuple of str)
+        """
+        return self._iter_batches(self._batch_get_edges, batch_size)
+
+    def _iter_batches(self, batch_get, batch_size):
+        cursor = prefetched = 0
+        while cursor != -1:
+            previous_cursor = cursor
+            batch, cursor, prefetched = batch_get(
+                batch_size, cursor, prefetched)
+            # the next batch likely spans as many slots as this one: read
+            # ahead what is not already
+            end = 2 * cursor - previous_cursor
+            if cursor != -1 and end > prefetched:
+                start = max(cursor, prefetched)
+                self._prefetch(start, end - start)
+                prefetched = end
+            if batch:
+                yield batch
+
+    def readall_edges(self):
+        """Read all edges at once, in a single scan of the table
+
+        Returns:
+            list[tuple]: list of edges (tuple of str)
+        """
+        try:
+            sources, targets, keys = self._index_edges()
+        except ImportError:
+            # NumPy is optional: fall back to decoding edges one by one
+            return [self._get_keys_from_edge(edge)
+                    for edge in self._iter_edges()]
+        return [(keys[u], keys[v])
+                for u, v in zip(sources.tolist(), targets.tolist())]
 
     def adjacency_matrix(self, weight=None):
         """Return adjacency matrix of the graph
@@ -1194,39 +1705,25 @@ class Graph:
         Returns:
             scipy.sparse.csr_matrix: sparse matrix representing the graph
         """
+        sources, targets, keys = self._index_edges()
+        A = self._build_adjacency(sources, targets, len(keys))
+        return A, dict(enumerate(keys))
+
+    def _index_edges(self):
+        # read edge endpoints (as table positions) straight from the table,
+        # and map them to contiguous indices in one vectorized pass, so that
+        # each node key is only read once
         import numpy as np
-        from scipy.sparse import csr_matrix
 
-        node_to_index = {}
-        index_to_node = {}
-        index = 0
-        xs = []
-        ys = []
-        data = []
-        for source, target in self.edges:
-            source_id = node_to_index.get(source)
-            if source_id is None:
-                node_to_index[source] = index
-                index_to_node[index] = source
-                source_id = index
-                index += 1
-
-            target_id = node_to_index.get(target)
-            if target_id is None:
-                node_to_index[target] = index
-                index_to_node[index] = target
-                target_id = index
-                index += 1
-
-            xs.append(source_id)
-            ys.append(target_id)
-            if weight is None:
-                data.append(1)
-
-        if weight is None:
-            dtype = np.bool_
-        A = csr_matrix((data, (xs, ys)), shape=(index, index), dtype=dtype)
-        return A, index_to_node
+        edges = self._scan_edges("source_position", "target_position")
+        n_edges = len(edges)
+        positions, inverse = np.unique(
+            np.concatenate((edges["source_position"],
+                            edges["target_position"])),
+            return_inverse=True)
+        _get_node_at = self._get_node_at
+        keys = [_get_node_at(position).key for position in positions.tolist()]
+        return inverse[:n_edges], inverse[n_edges:], keys
 
     def subgraph(self, nodes, weight=None):
         """Return adjacency matrix of a subgraph
@@ -1239,31 +1736,41 @@ class Graph:
             scipy.sparse.csr_matrix: sparse matrix representing the subgraph
         """
         import numpy as np
-        from scipy.sparse import csr_matrix
+
+        _get_edge_at = self._get_edge_at
+        _edge_out_dfs = self._edge_out_dfs
 
         index_to_node = dict(enumerate(set(nodes)))
-        node_to_index = {v: k for k, v in index_to_node.items()}
+        leaves = [self.node(key) for key in index_to_node.values()]
         n_nodes = len(index_to_node)
 
+        # match neighbors by table position: no key has to be read
+        position_to_index = {
+            leaf.position: index for index, leaf in enumerate(leaves)}
         xs = []
         ys = []
-        data = []
-        for source in nodes:
-            source_id = node_to_index[source]
-            for target in self.neighbors(source):
-                target_id = node_to_index.get(target, None)
+        for source_id, leaf in enumerate(leaves):
+            start = _get_edge_at(leaf.edge_start)
+            for edge in _edge_out_dfs(start):
+                target_id = position_to_index.get(edge.target_position)
                 if target_id is None:
                     continue
                 xs.append(source_id)
                 ys.append(target_id)
-                if weight is None:
-                    data.append(1)
 
-        if weight is None:
-            dtype = np.bool_
-        A = csr_matrix((data, (xs, ys)), shape=(n_nodes, n_nodes), dtype=dtype)
+        A = self._build_adjacency(
+            np.array(xs, dtype=np.int32), np.array(ys, dtype=np.int32),
+            n_nodes)
         return A, index_to_node
 
+    def _build_adjacency(self, rows, cols, n_nodes):
+        import numpy as np
+        from scipy.sparse import coo_matrix
+
+        data = np.ones(len(rows), dtype=np.bool_)
+        return coo_matrix(
+            (data, (rows, cols)), shape=(n_nodes, n_nodes)).tocsr()
+
     # =========================================================================
     # Overload
     # =========================================================================
@@ -1280,7 +1787,7 @@ class Graph:
         Returns:
             node_class or edge_class: node or edge
         """
-        if isinstance(item, str):
+        if isinstance(item, (str, bytes)):
             return self.node(item)
         elif isinstance(item, tuple):
             return self.edge(*item)
@@ -1301,7 +1808,7 @@ class Graph:
         if isinstance(item, tuple):
             if 2 <= len(item) <= 3:
                 return self.has_edge(*item)
-        elif isinstance(item, str):
+        elif isinstance(item, (str, bytes)):
             return self.has_node(item)
         raise KinbakuException("argument not understood")
 
@@ -1313,20 +1820,41 @@ class Graph:
     # =========================================================================
 
     def _set_node_at(self, leaf, position):
-        values = self._parse_values(leaf)
         ind = position * self.EDGE_SIZE + self.HEADER_SIZE
-        self.mm[ind: ind + self.NODE_SIZE] = pack(self.NODE_FORMAT, *values)
+        buffer = self._node_buffer
+        self._pack_node(buffer, 0, leaf)
+        self._check_position(ind, self.NODE_SIZE, "node", position)
+        self.mm[ind: ind + self.NODE_SIZE] = buffer
         self._cache_node(leaf)
 
     def _set_edge_at(self, edge, position):
-        values = self._parse_values(edge)
+        # the record is packed aside, then copied: a value that does not fit
+        # its field raises before anything is written, rather than leaving a
+        # half-packed record in the table
         ind = position * self.EDGE_SIZE + self.HEADER_SIZE
-        try:
-            self.mm[ind: ind + self.EDGE_SIZE] = pack(
-                self.EDGE_FORMAT, *values)
-        except IndexError:
-            print(self.header.table_size, ind + self.EDGE_SIZE, ind)
-            raise IndexError
+        buffer = self._edge_buffer
+        self._pack_edge(buffer, 0, edge)
+        self._check_position(ind, self.EDGE_SIZE, "edge", position)
+        self.mm[ind: ind + self.EDGE_SIZE] = buffer
+
+    def _check_position(self, ind, size, name, position):
+        if ind + size > len(self.mm):
+            raise IndexError(
+                f"{name} position {position} is out of the table "
+                f"(table size: {self.header.table_size})")
+
+    def _set_node_link(self, position, name, value):
+        # write a single (int) tree link of the node at position: the node
+        # must be cached again by the caller
+        ind = (position * self.EDGE_SIZE + self.HEADER_SIZE +
+               self.NODE_FIELDS[name][0])
+        self.INT_STRUCT.pack_into(self.mm, ind, value)
+
+    def _set_edge_link(self, position, name, value):
+        # write a single (int) tree link of the edge at position
+        ind = (position * self.EDGE_SIZE + self.HEADER_SIZE +
+               self.EDGE_FIELDS[name][0])
+        self.INT_STRUCT.pack_into(self.mm, ind, value)
 
     def _erase_edge_at(self, position):
         ind = position * self.EDGE_SIZE + self.HEADER_SIZE
@@ -1354,7 +1882,8 @@ class Graph:
         """Add a single node to graph, with optional attributes.
 
         Args:
-            key (str): string key uniquely identifying a node
+            key (str or bytes): string key uniquely identifying a node.
+                                Bytes are decoded as UTF-8.
             attr (dict, optional): custom attributes. Must match the
                                    additional attributes provided in the
                                    `node_class` parameter. Defaults to None.
@@ -1362,24 +1891,24 @@ class Graph:
         Returns:
             node_class: returns node as an instance of Graph:`node_class`
         """
+        if isinstance(key, bytes):
+            key = key.decode()
+
         # key must be of appropriate size
         if len(key) > self.max_key_len:
             raise KeyTooLong
 
-        key_hash = self.hash_func(key)
-
-        # new node
-        new_node = self.node_class(
-            hash=key_hash, index=self.header.node_id, key=key)
-        self._parse_attributes(new_node, attr)
-
-        # initialize position from cache
         position = self.cache_key_to_pos.get(key)
-        if position is None:
-            position = 0
-
-        # unroll tree
-        prev_node, state = self._find_node_pos(position, new_node)
+        prev_node = self.cache_pos_to_node.get(position)
+        if prev_node is not None:
+            # cached node: it already carries its hash, no search needed
+            new_node = self.node_class(
+                hash=prev_node.hash, index=self.header.node_id, key=key)
+            state = 0
+        else:
+            # unroll tree, starting from the cached position if any
+            new_node, prev_node, state = self._find_node(key, position or 0)
+        self._parse_attributes(new_node, attr)
 
         # node already exists
         if state == 0:
@@ -1404,6 +1933,13 @@ class Graph:
             self._set_node_at(new_node, new_node.position)
             return new_node
 
+        return self._insert_node(new_node, prev_node, state)
+
+    def _insert_node(self, new_node, prev_node, state):
+        # make sure the record can be packed (encoded key size, attribute
+        # ranges) before anything is written
+        self._pack_node(self._node_buffer, 0, new_node)
+
         # new node and edge positions
         new_node_position, node_recycled = self._get_next_node_position()
         self._increment_node(node_recycled)
@@ -1423,19 +1959,39 @@ class Graph:
         self._set_edge_at(edge, new_node.edge_start)
 
         # update parent node
-        if state == -1:
-            prev_node.left = new_node_position
-        else:
-            prev_node.right = new_node_position
-        self._set_node_at(prev_node, prev_node.position)
+        link = "left" if state == -1 else "right"
+        setattr(prev_node, link, new_node_position)
+        self._set_node_link(prev_node.position, link, new_node_position)
+        self._cache_node(prev_node)
         return new_node
 
+    def add_nodes(self, nodes, attr=None):
+        """Add many nodes to graph at once
+
+        Args:
+            nodes (iterable): node keys. Items can also be (key, attr)
+                              tuples, overriding the shared attributes.
+            attr (dict, optional): custom attributes shared by all nodes.
+                                   Defaults to None.
+
+        Examples
+        --------
+        >>> G.add_nodes(["A", "B", "C"])
+        >>> G.add_nodes([("A", {"age": 25}), ("B", {"age": 32})])
+        """
+        add_node = self.add_node
+        for node in nodes:
+            if isinstance(node, (str, bytes)):
+                add_node(node, attr)
+            else:
+                add_node(*node)
+
     def add_edge(self, source_key, target_key, attr=None, edge_type=0):
         """Add a single edge with custom attributes to graph
 
         Args:
-            source_key (str): string key of the source node
-            target_key (str): string key of the target node
+            source_key (str or bytes): string key of the source node
+            target_key (str or bytes): string key of the target node
             attr (dict, optional): not yet implemented. Defaults to None.
             edge_type (int, optional): integer identifier of the edge type.
                                        Defaults to 0.
@@ -1443,14 +1999,8 @@ class Graph:
         Returns:
             edge_class: returns edge as an instance of Graph:`edge_class`
         """
-        try:
-            source = self.node(source_key)
-        except NodeNotFound:
-            source = self.add_node(source_key)
-        try:
-            target = self.node(target_key)
-        except NodeNotFound:
-            target = self.add_node(target_key)
+        source = self._get_or_add_node(source_key)
+        target = self._get_or_add_node(target_key)
 
         # new edge to create
         new_edge = self.edge_class(source_position=source.position,
@@ -1462,8 +2012,10 @@ class Graph:
 
         # =====================================================================
         # OUT direction
-        prev_out, state = self._find_edge_out_pos(source.edge_start, new_edge)
+        prev_out_position, state = self._find_edge_out_pos(
+            source.edge_start, new_edge)
         if state == 0:  # edge already exists
+            prev_out = self._get_edge_at(prev_out_position)
             if prev_out == new_edge:
                 return prev_out
             new_edge_position = prev_out.position
@@ -1490,39 +2042,104 @@ class Graph:
             )
             self._set_edge_at(new_edge, new_edge_position)
             return new_edge
-        else:
-            self._parse_attributes(new_edge, attr)
-            new_edge_position, recycled = self._get_next_edge_position()
-            new_edge.position = new_edge_position
-
-        if state == -1:  # must insert left
-            prev_out.out_edge_left = new_edge_position
-        else:  # must insert right
-            prev_out.out_edge_right = new_edge_position
-        # update previous out-edge
-        self._set_edge_at(prev_out, prev_out.position)
 
         # =====================================================================
         # IN direction
-        prev_in, state = self._find_edge_in_pos(target.edge_start, new_edge)
-        if state == -1:
-            prev_in.in_edge_left = new_edge_position
-        elif state == 1:
-            prev_in.in_edge_right = new_edge_position
-        else:  # edge shouldn't exist
+        prev_in_position, in_state = self._find_edge_in_pos(
+            target.edge_start, new_edge)
+        if in_state == 0:  # edge shouldn't exist
             raise KinbakuError("serious integrity error")
 
-        # update previous in-edge
-        self._set_edge_at(prev_in, prev_in.position)
-
         # =====================================================================
-        # insert new edge
-        new_edge.out_edge_parent = prev_out.position
-        new_edge.in_edge_parent = prev_in.position
-        self._set_edge_at(new_edge, new_edge_position)
+        # insert new edge: its record is written before the links to it, so
+        # that a value that cannot be packed leaves the trees untouched
+        new_edge_position, recycled = self._get_next_edge_position()
+        new_edge.position = new_edge_position
+        new_edge.out_edge_parent = prev_out_position
+        new_edge.in_edge_parent = prev_in_position
+        try:
+            self._set_edge_at(new_edge, new_edge_position)
+        except Exception:
+            if recycled:
+                self.edge_tombstone.insert(0, new_edge_position)
+            raise
+
+        # update previous out-edge and in-edge: only their links are written
+        if state == -1:  # must insert left
+            self._set_edge_link(
+                prev_out_position, "out_edge_left", new_edge_position)
+        else:  # must insert right
+            self._set_edge_link(
+                prev_out_position, "out_edge_right", new_edge_position)
+        if in_state == -1:
+            self._set_edge_link(
+                prev_in_position, "in_edge_left", new_edge_position)
+        else:
+            self._set_edge_link(
+                prev_in_position, "in_edge_right", new_edge_position)
         self._increment_edge(recycled)
         return new_edge
 
+    def add_edges(self, edges, attr=None, edge_type=0):
+        """Add many edges to graph at once
+
+        Args:
+            edges (iterable): (source_key, target_key) pairs. Items can also
+                              be (source_key, target_key, attr) or
+                              (source_key, target_key, attr, edge_type)
+                              tuples, overriding the shared values.
+            attr (dict, optional): custom attributes shared by all edges.
+                                   Defaults to None.
+            edge_type (int, optional): integer identifier of the edge type.
+                                       Defaults to 0.
+
+        The edges are read and inserted by chunks, so that iterators are
+        consumed as the insertion goes rather than all at once.
+
+        Examples
+        --------
+        >>> G.add_edges([("A", "B"), ("B", "C")])
+        >>> G.add_edges((u, v) for u, v in G_nx.edges)
+        """
+        # the input is consumed in bounded chunks, so that it can be streamed
+        edges = iter(edges)
+        chunk = list(islice(edges, self.ADD_EDGES_CHUNK))
+        while chunk:
+            self._add_edges_chunk(chunk, attr, edge_type)
+            chunk = list(islice(edges, self.ADD_EDGES_CHUNK))
+
+    def _add_edges_chunk(self, edges, attr, edge_type):
+        # resolve each endpoint only once, growing the file at most once.
+        # Slots are only reserved for what is certainly new (see _reserve,
+        # which at least doubles the table): nodes of keys missing from the
+        # cache, and edges with a new endpoint. The rest is left to _expand
+        keys = dict.fromkeys(key for edge in edges for key in edge[:2])
+        cached = self.cache_key_to_pos
+        self._reserve(sum(key not in cached for key in keys) *
+                      (self.NODE_TO_EDGE_RATIO + 1))
+        _get_or_add_node = self._get_or_add_node
+        header = self.header
+        nodes = {}
+        new_keys = set()
+        for key in keys:
+            n_nodes = header.n_nodes
+            nodes[key] = _get_or_add_node(key)
+            if header.n_nodes != n_nodes:
+                new_keys.add(key)
+
+        self._reserve(sum(edge[0] in new_keys or edge[1] in new_keys
+                          for edge in edges))
+        add_edge = self.add_edge
+        for edge in edges:
+            source, target = nodes[edge[0]], nodes[edge[1]]
+            size = len(edge)
+            if size == 2:
+                add_edge(source, target, attr, edge_type)
+            elif size == 3:
+                add_edge(source, target, edge[2], edge_type)
+            else:
+                add_edge(source, target, *edge[2:])
+
     def remove_edge(self, source_key, target_key, edge_type=0):
         """Remove the edge linking source to target, with the given edge_type
 
@@ -1580,12 +2197,15 @@ class Graph:
     # Utils
     # =========================================================================
 
-    def _str_to_list(self, key):
-        res = [ord(c) for c in key]
-        res += [0] * (self.max_str_len - len(res))
-        return res
+    def _text_encoder(self, length, error, *args):
+        # encoder of text fields of the given length: the encoding and the
+        # size limit are bound as locals, rather than read on every write
+        encoding = self.char_encoding
+        size = length * self.char_size
 
-    def _key_to_list(self, key):
-        res = [ord(c) for c in key]
-        res += [0] * (self.max_key_len - len(res))
-        return res
+        def encode(value):
+            data = value.encode(encoding)
+            if len(data) > size:
+                raise error(*args)
+            return data
+        return encode
@@ -1,7 +1,20 @@
-from dataclasses import dataclass, field
+import sys
+from dataclasses import dataclass, field, fields
 
+# records are decoded by the million: give them slots rather than an
+# instance dict where dataclasses support it (Python 3.10+)
+if sys.version_info >= (3, 10):
+    record = dataclass(slots=True)
+else:
+    record = dataclass
 
-@dataclass
+
+def _items(item):
+    # (name, value) of all fields: slotted records have no __dict__ to vars()
+    return ((f.name, getattr(item, f.name)) for f in fields(item))
+
+
+@record
 class Header:
     n_nodes: int
     n_edges: int
@@ -11,7 +24,7 @@ class Header:
     class_length: int
 
 
-@dataclass
+@record
 class Edge:
     is_node: bool = False
     exists: bool = True
@@ -31,7 +44,7 @@ class Edge:
     def __repr__(self):
         txt = f"{self.__class__.__name__}("
         attr = []
-        for key, val in vars(self).items():
+        for key, val in _items(self):
             if key in {
                 "is_node", "exists", "is_edge_start", "position",
                 "source_position", "target_position", "hash", "out_edge_left",
@@ -48,7 +61,7 @@ class Edge:
 
     def data(self):
         res = {}
-        for key, val in vars(self).items():
+        for key, val in _items(self):
             if key in {
                 "is_node", "exists", "is_edge_start", "position",
                 "source_position", "target_position", "hash", "out_edge_left",
@@ -61,7 +74,7 @@ class Edge:
             res[key] =val
         return res
 
-@dataclass
+@record
 class Node:
     is_node: bool = True
     exists: bool = True
@@ -77,7 +90,7 @@ class Node:
     def __repr__(self):
         txt = f"{self.__class__.__name__}("
         attr = []
-        for key, val in vars(self).items():
+        for key, val in _items(self):
             if key in {
                 "is_node", "exists", "hash", "left", "right", "index",
                 "position", "parent", "edge_start"
@@ -92,7 +105,7 @@ class Node:
     
     def data(self):
         res = {}
-        for key, val in vars(self).items():
+        for key, val in _items(self):
             if key in {
                 "is_node", "exists", "hash", "left", "right", "index",
                 "position", "parent", "edge_start"
@@ -1,66 +1,82 @@
+import codecs
+import sys
+from struct import calcsize
+
+from .exception import KinbakuError
+
+
+class Cache(dict):
+    """Dict holding at most maxsize items: the oldest insertions are evicted
+    first. Lookups are left to dict, so that cache hits stay in C."""
+    __slots__ = ("maxsize",)
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if len(self) > self.maxsize:
+            del self[next(iter(self))]
+
+
 def compare_nodes(node_A_hash, node_A_key, node_B):
     node_B_hash = node_B.hash
-    if node_B_hash < node_A_hash:
-        return -1
-    elif node_B_hash > node_A_hash:
-        return 1
-    else:  # hashes are equal
-        node_B_key = node_B.key
-        if node_B_key < node_A_key:
-            return -1
-        elif node_B_key > node_A_key:
-            return 1
-        else:
-            return 0
+    if node_B_hash != node_A_hash:
+        return (node_B_hash > node_A_hash) - (node_B_hash < node_A_hash)
+    # hashes are equal
+    node_B_key = node_B.key
+    return (node_B_key > node_A_key) - (node_B_key < node_A_key)
 
 
 def compare_edges(A, B):
     A_hash = A.hash
     B_hash = B.hash
-    if B_hash < A_hash:
-        return -1
-    elif B_hash > A_hash:
-        return 1
-    else:  # hashes are equal
-        A_source, A_target, A_type = (
-            A.source_position, A.target_position, A.type)
-        B_source, B_target, B_type = (
-            B.source_position, B.target_position, B.type)
+    if B_hash != A_hash:
+        return (B_hash > A_hash) - (B_hash < A_hash)
+    # hashes are equal
+    return compare_edge_ties(
+        (A.source_position, A.target_position, A.type),
+        (B.source_position, B.target_position, B.type))
+
+
+def compare_edge_ties(A, B):
+    # order of edges of equal hashes, given as (source, target, type): edges
+    # of a same source are ordered by target and type, the others go left
+    # only when their target (then source) or else their type is lower.
+    # Files rely on this order, so it must not change
+    A_source, A_target, A_type = A
+    B_source, B_target, B_type = B
+    if A_source == B_source:
+        return ((B_target, B_type) > (A_target, A_type)) - (
+            (B_target, B_type) < (A_target, A_type))
+    if B_target < A_target:
+        return 1 - 2 * (B_source < A_source)
+    return 1 - 2 * (B_type < A_type)
 
-        # edges are equal, return 0
-        if (
-            A_source == B_source and
-            A_target == B_target and
-            A_type == B_type
-        ):
-            return 0
-        if A_source == B_source:
-            # case where sources are equal
-            if B_target < A_target:
-                return -1
-            elif B_target > A_target:
-                return 1
-            elif B_type < A_type:
-                return -1
-            elif B_type > A_type:
-                return 1
-            else:
-                return 0
-        elif B_target < A_target:
-            # case where targets are equal
-            if B_source < A_source:
-                return -1
-            elif B_source > A_source:
-                return 1
-            elif B_type < A_type:
-                return -1
-            else:
-                return 1
-        elif B_type < A_type:
-            return -1
-        else:
-            return 1
 
+def get_encoding(char_format, char_encoding=None):
+    # text encoding storing each character as one char_format unit, in
+    # native byte order. 1-byte units hold latin-1, unless UTF-8 is asked
+    # for: any key then fits as long as its encoding does
+    size = calcsize(char_format)
+    byteorder = "le" if sys.byteorder == "little" else "be"
+    if size == 1:
+        encoding = "latin-1"
+    elif size == 2:
+        encoding = f"utf-16-{byteorder}"
+    elif size == 4:
+        encoding = f"utf-32-{byteorder}"
+    else:
+        raise KinbakuError(f"unsupported char_format: {char_format}")
+    if char_encoding is None:
+        return encoding
 
-def to_string(data):
-    return u"".join(chr(c) for c in data if c != 0)
+    name = codecs.lookup(char_encoding).name
+    if name == codecs.lookup(encoding).name:
+        return encoding
+    if size == 1 and name == "utf-8":
+        return name
+    raise KinbakuError(
+        f"unsupported char_encoding for char_format {char_format}: "
+        f"{char_encoding}")
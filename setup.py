@@ -15,7 +15,7 @@ setuptools.setup(
     url="https://github.com/kerighan/kinbaku",
     packages=setuptools.find_packages(),
     include_package_data=True,
-    install_requires=["cachetools"],
+    install_requires=[],
     classifiers=[
         "Intended Audience :: Developers",
         "Programming Language :: Python :: 3",
@@ -1,5 +1,8 @@
+import hashlib
 import os
 import random
+import struct
+from dataclasses import dataclass
 
 import kinbaku as kn
 import networkx as nx
@@ -7,15 +10,28 @@ import pytest
 
 
 @pytest.fixture()
-def G():
-    graph = kn.Graph("test.db", flag="n")
-    yield graph
+def graph():
+    # opens test.db with the given parameters, closing the graph opened
+    # before: pass flag="w" to reopen the file
+    graphs = []
 
-    graph.close()
-    del graph
+    def open_graph(flag="n", **kwargs):
+        if graphs:
+            graphs[-1].close()
+        graphs.append(kn.Graph("test.db", flag=flag, **kwargs))
+        return graphs[-1]
+    yield open_graph
+
+    for G in graphs:
+        G.close()
     os.remove("test.db")
 
 
+@pytest.fixture()
+def G(graph):
+    return graph()
+
+
 @pytest.fixture()
 def nodes(N):
     return [f"node_{i}" for i in range(N)]
@@ -41,6 +57,14 @@ def test_add_nodes(G, N, nodes):
         assert nodes[i] in G
 
 
+def test_add_nodes_bulk(G, N, nodes):
+    G.add_nodes(nodes)
+    G.add_nodes(nodes[:N // 2])
+
+    assert N == G.n_nodes
+    assert set(G.nodes) == set(nodes)
+
+
 def test_neighbors(G, G_nx, nodes):
     for u, v in G_nx.edges:
         G.add_edge(u, v)
@@ -61,3 +85,256 @@ def test_neighbors(G, G_nx, nodes):
         predecessors_found = set(G.predecessors(node))
         predecessors_true = set(G_nx.predecessors(node))
         assert predecessors_found == predecessors_true
+
+        if node in G_nx:
+            assert G.out_degree(node) == G_nx.out_degree(node)
+            assert G.in_degree(node) == G_nx.in_degree(node)
+
+
+def test_add_edges(G, G_nx):
+    G.add_edges(G_nx.edges)
+
+    assert G.n_edges == G_nx.number_of_edges()
+    assert G.n_nodes == G_nx.number_of_nodes()
+    for u, v in G_nx.edges:
+        assert G.has_edge(u, v)
+
+
+def test_add_edges_stream(G, G_nx):
+    G.ADD_EDGES_CHUNK = 7
+    inserted = []
+
+    def stream():
+        for edge in G_nx.edges:
+            inserted.append(G.n_edges)
+            yield edge
+    G.add_edges(stream())
+
+    # the input is consumed along with the insertion
+    assert inserted[-1] > 0
+    assert G.n_edges == G_nx.number_of_edges()
+    assert sorted(G.edges) == sorted(G_nx.edges)
+
+
+def test_add_edges_existing(graph, G_nx):
+    G = graph(table_increment=1000)
+    G.add_edges(G_nx.edges)
+    table_size = G.header.table_size
+
+    # edges between known nodes reserve nothing, even near capacity
+    free = table_size - G.header.next_table_position
+    G.add_edges(list(G_nx.edges) * (free // len(G_nx.edges) + 1))
+    assert G.header.table_size == table_size
+    assert G.n_edges == G_nx.number_of_edges()
+
+
+def test_batches(G, G_nx):
+    G.add_edges(G_nx.edges)
+
+    edges = []
+    for batch in G.iter_edges_batches(batch_size=7):
+        assert 0 < len(batch) <= 7
+        edges.extend(batch)
+    assert sorted(edges) == sorted(G_nx.edges)
+    assert sorted(G.readall_edges()) == sorted(G_nx.edges)
+
+    nodes = []
+    for batch in G.iter_nodes_batches(batch_size=7):
+        nodes.extend(node.key for node in batch)
+    assert sorted(nodes) == sorted(G_nx.nodes)
+
+
+def test_edges_windows(graph, G_nx):
+    # nodes span several slots, some of them across window boundaries
+    G = graph(max_key_len=120)
+    assert G.NODE_TO_EDGE_RATIO > 1
+    G.SCAN_WINDOW = 5
+    G.add_edges(G_nx.edges)
+
+    assert sorted(G.edges) == sorted(G_nx.edges)
+    assert sorted(G.edges) == sorted(G.readall_edges())
+
+
+def test_common_neighbors(G, G_nx, nodes):
+    G.add_edges(G_nx.edges)
+
+    pairs = [(u, v) for u in nodes[:10] for v in nodes[:10]]
+    many = G.common_neighbors_many(pairs)
+    for (u, v), found in zip(pairs, many):
+        true = set(G_nx.successors(u)) & set(G_nx.successors(v))
+        assert found == true
+        assert G.common_neighbors(u, v) == true
+        assert G.common_predecessors(u, v) == (
+            set(G_nx.predecessors(u)) & set(G_nx.predecessors(v)))
+
+
+def test_bytes_keys(G):
+    G.add_node(b"A")
+    G.add_edge(b"A", b"B")
+    G.add_nodes([b"C"])
+
+    assert set(G.nodes) == {"A", "B", "C"}
+    assert G.node(b"B").key == "B"
+    assert G.has_edge("A", "B")
+    assert list(G.neighbors(b"A")) == ["B"]
+
+
+@dataclass(repr=False)
+class User(kn.structure.Node):
+    name: str = ""
+    age: int = 0
+
+
+@dataclass(repr=False)
+class Friendship(kn.structure.Edge):
+    since: str = ""
+    love: float = 0.
+
+
+def test_custom_attributes(graph):
+    G = graph(node_class=User, edge_class=Friendship)
+    G["john"] = {"name": "John B.", "age": 32}
+    G.add_edge("john", "jack", {"since": "2019", "love": .5})
+    G.empty_cache()
+
+    assert G["john"].name == "John B."
+    assert G["john"].age == 32
+    assert G["jack"].name == ""
+    assert G["john", "jack"].since == "2019"
+    assert G["john", "jack"].love == .5
+    assert list(G.edges) == [("john", "jack")]
+
+
+def test_latin1_keys(graph):
+    # 1-byte formats store one latin-1 byte per character by default
+    G = graph(char_format="B", max_key_len=5)
+    G.add_edge("plain", "café")
+    with pytest.raises(UnicodeEncodeError):
+        G.add_node("東京")
+
+    G = graph(flag="w", char_format="B", max_key_len=5)
+    assert set(G.nodes) == {"plain", "café"}
+    assert G.has_edge("plain", "café")
+    assert G.node("café").key == "café"
+
+
+def test_utf8_keys(graph):
+    G = graph(char_format="B", char_encoding="utf-8")
+    G.add_edge("café", "東京")
+    G.add_edge("東京", "x" * 15)
+    with pytest.raises(kn.exception.KeyTooLong):
+        G.add_node("東京" * 3)
+    assert G.n_nodes == 3
+
+    G = graph(flag="w", char_format="B", char_encoding="utf-8")
+    assert set(G.nodes) == {"café", "東京", "x" * 15}
+    assert G.has_edge("café", "東京")
+    assert list(G.neighbors("東京")) == ["x" * 15]
+
+
+def test_utf8_strings_too_long(graph):
+    G = graph(char_format="B", char_encoding="utf-8",
+              node_class=User, edge_class=Friendship)
+    G.add_edge("a", "b", {"since": "é" * 7})
+    with pytest.raises(kn.exception.KinbakuError):
+        G.add_node("c", {"name": "é" * 15})
+    with pytest.raises(kn.exception.KinbakuError):
+        G.add_edge("a", "b", {"since": "é" * 15})
+    with pytest.raises(kn.exception.KinbakuError):
+        G.add_edge("a", "d", {"since": "é" * 15})
+
+    # nothing was written by the failed insertions
+    assert G.n_nodes == len(list(G.nodes)) == 3
+    assert G.n_edges == 1
+    assert list(G.neighbors("a")) == ["b"]
+    assert G.out_degree("a") == 1
+    assert G["a", "b"].since == "é" * 7
+
+
+@dataclass(repr=False)
+class Weighted(kn.structure.Edge):
+    weight: int = 0
+
+
+def test_values_out_of_range(graph):
+    G = graph(node_class=User, edge_class=Weighted)
+    G.add_edge("a", "b")
+    with pytest.raises(struct.error):
+        G.add_node("c", {"age": 2 ** 70})
+    with pytest.raises(struct.error):
+        G.add_node("a", {"age": 2 ** 70})
+    with pytest.raises(struct.error):
+        G.add_edge("a", "b", {"weight": 2 ** 70})
+    with pytest.raises(struct.error):
+        G.add_edge("a", "c", {"weight": 2 ** 70})
+
+    # nothing was written by the failed insertions and updates
+    assert G.n_nodes == len(list(G.nodes)) == 3
+    assert G.n_edges == 1
+    assert list(G.neighbors("a")) == ["b"]
+    assert G.out_degree("a") == 1
+    G.empty_cache()
+    assert G["a"].key == "a"
+    assert G["a", "b"].weight == 0
+
+
+def hash64(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+def test_hash_format(graph, G_nx):
+    G = graph(hash_func=hash64, hash_format="Q")
+    G.add_edges(G_nx.edges)
+
+    G = graph(flag="w", hash_func=hash64, hash_format="Q")
+    assert sorted(G.edges) == sorted(G_nx.edges)
+    for u, v in G_nx.edges:
+        assert G.has_edge(u, v)
+
+
+def signed_hash64(key):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "little",
+        signed=True)
+
+
+def test_signed_hash_format(graph, G_nx):
+    G = graph(hash_func=signed_hash64, hash_format="q")
+    G.add_edges(G_nx.edges)
+
+    G = graph(flag="w", hash_func=signed_hash64, hash_format="q")
+    assert sorted(G.edges) == sorted(G_nx.edges)
+    assert set(G.nodes) == set(G_nx.nodes)
+    for u, v in G_nx.edges:
+        assert G.has_edge(u, v)
+
+
+def test_compact_layout(graph, G_nx):
+    G = graph(int_format="i", char_format="B")
+    assert G.EDGE_SIZE == 48 and G.NODE_TO_EDGE_RATIO == 1
+    G.add_edges(G_nx.edges)
+
+    G = graph(flag="w", int_format="i", char_format="B")
+    assert sorted(G.edges) == sorted(G_nx.edges)
+    assert set(G.nodes) == set(G_nx.nodes)
+
+
+def test_find_tombstones(graph, G_nx):
+    G = graph()
+    G.add_edges(G_nx.edges)
+    removed = list(G_nx.edges)[::3]
+    for u, v in removed:
+        G.remove_edge(u, v)
+        G_nx.remove_edge(u, v)
+
+    G = graph(flag="w")
+    G.find_tombstones()
+    assert sorted(G.edge_tombstone) == sorted(set(G.edge_tombstone))
+    assert len(G.edge_tombstone) == len(removed)
+
+    # recycled slots must not overwrite live records
+    G.add_edges(removed)
+    G_nx.add_edges_from(removed)
+    assert sorted(G.edges) == sorted(G_nx.edges)
+    assert set(G.nodes) == set(G_nx.nodes)